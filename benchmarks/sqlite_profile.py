@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+"""Compare SQLite throughput with the default and performance pragma profiles.
+
+Measures the two patterns of a DAWPaG terminal:
+
+    save: one INSERT and one COMMIT per row, as Model.save() does
+    search: LIKE searches limited by database.query_limit, run while another
+        connection keeps saving rows
+
+The pragmas come from dawpag.sqlite_profiles, which has no dependencies, so
+this runs with only the sqlite3 module of the standard library.
+Usage: python benchmarks/sqlite_profile.py [rows] [seconds]
+"""
+
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+from dawpag.sqlite_profiles import SQLITE_PROFILES
+
+QUERY_LIMIT = 50
+
+
+def connect(file_name, pragmas):
+    con = sqlite3.connect(file_name, timeout=30)
+    for name, value in pragmas:
+        con.execute('PRAGMA %s=%s' % (name, value))
+    return con
+
+
+def create(file_name, pragmas, rows):
+    con = connect(file_name, pragmas)
+    con.execute('CREATE TABLE product (id INTEGER PRIMARY KEY, '
+        'code VARCHAR(20), name VARCHAR(100), price NUMERIC(10, 2))')
+    con.executemany('INSERT INTO product (code, name, price) VALUES (?, ?, ?)',
+        [('P%06d' % i, 'Product %d' % i, i * 0.5) for i in range(rows)])
+    con.commit()
+    con.close()
+
+
+def bench_save(file_name, pragmas, rows):
+    con = connect(file_name, pragmas)
+    start = time.time()
+    for i in range(rows):
+        con.execute('INSERT INTO product (code, name, price) VALUES (?, ?, ?)',
+            ('S%06d' % i, 'Saved %d' % i, i * 0.5))
+        con.commit()
+    elapsed = time.time() - start
+    con.close()
+    return rows / elapsed
+
+
+def bench_search(file_name, pragmas, seconds):
+    running = [True]
+
+    def writer():
+        con = connect(file_name, pragmas)
+        i = 0
+        while running[0]:
+            con.execute('INSERT INTO product (code, name, price) '
+                'VALUES (?, ?, ?)', ('W%06d' % i, 'Written %d' % i, 1))
+            con.commit()
+            i += 1
+        con.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    con = connect(file_name, pragmas)
+    searches = 0
+    start = time.time()
+    try:
+        while time.time() - start < seconds:
+            con.execute('SELECT * FROM product WHERE name LIKE ? LIMIT ?',
+                ('%%%d%%' % (searches % 1000), QUERY_LIMIT)).fetchall()
+            searches += 1
+    finally:
+        elapsed = time.time() - start
+        running[0] = False
+        thread.join()
+        con.close()
+    return searches / elapsed
+
+
+def main():
+    rows = 2000
+    seconds = 3.0
+    if len(sys.argv) > 1:
+        rows = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        seconds = float(sys.argv[2])
+    directory = tempfile.mkdtemp()
+    try:
+        print('%-12s %12s %12s' % ('profile', 'saves/s', 'searches/s'))
+        for name in sorted(SQLITE_PROFILES):
+            pragmas = SQLITE_PROFILES[name]
+            file_name = os.path.join(directory, '%s.sqlite' % name)
+            create(file_name, pragmas, 50000)
+            saves = bench_save(file_name, pragmas, rows)
+            searches = bench_search(file_name, pragmas, seconds)
+            print('%-12s %12.0f %12.1f' % (name, saves, searches))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -21,26 +21,48 @@
 
 from dawpag.base_window import BaseWindow
 from dawpag import utils as u
-from dawpag.database import session
+from dawpag.database import session, statement_count, merge_results, \
+    get_engine
 from dawpag.ui.entry import MaskEntry
-from dawpag.enums import DataState, ColumnDraw
+from dawpag.ui.lazy_model import LazyQueryModel, PlaceholderRow
+from dawpag.ui.relation_completion import RelationCompletion
+from dawpag.ui.combo_index import ComboIndex
+from dawpag.enums import DataState, ColumnDraw, WidgetKind
+from dawpag.binding import FieldBinding, get_field_info
 from dawpag import message as m
 from dawpag.configuration import config as cfg
 from dawpag.exceptions import RangeError
-
+from dawpag.query_worker import QueryWorker
+from dawpag import search_index
+from dawpag import lookup_cache
+from dawpag import glade_cache
+from dawpag import window_pool
+from dawpag import controller_pool
+
+from sqlalchemy.orm import class_mapper, eagerload, object_session
 from sqlalchemy.orm.properties import PropertyLoader, ColumnProperty
 from sqlalchemy.orm.attributes import InstrumentedAttribute
-from sqlalchemy import and_, DateTime, Numeric#, Boolean, Text, String, Integer,
+from sqlalchemy import and_#, DateTime, Numeric, Boolean, Text, String, Integer,
 
 from datetime import datetime
-import decimal
+import gobject
 import gtk
 
 log = u.get_logger('dawpag.base_controller')
 
 msk_masked = "__%s__mAsKeD_"
 
+# Maximum number of parent keys in a single IN clause when loading trees
+TREE_BATCH_SIZE = 500
+
 class BaseController(BaseWindow):
+    # Set to True to keep closed windows of the controller hidden for reuse,
+    # see dawpag.controller_pool
+    pooled = False
+    # Width of the search columns when the tree model is a LazyQueryModel,
+    # columns are not sized by their contents then
+    lazy_column_width = 120
+
     # Magic Methods
     def __init__(self, search=True):
         self.name = _(u'Nome indefinido')
@@ -65,10 +87,56 @@ class BaseController(BaseWindow):
         # Pointer to the first widget on data panel
         self.__first_widget = None
         # Connections between widget on viwew and field on model
-        self.__widget_fields = []
+        self.__bindings = []
+        # Idle source that takes the object selected on treeview when its
+        # cursor settles
+        self.__cursor_idle = None
 
         self.__tree_filter = None
+        # Model class of each combo created by relation_combo, these combos
+        # hold the object ids
+        self.__relation_combos = {}
+        # Fields whose relation combos query only the options matching the
+        # typed text, for big lookup tables. Their widgets need to be
+        # gtk.ComboBoxEntry
+        self.lazy_relations = []
+        self.__relation_completions = {}
+        # Index of the rows of combos filled by relation_combo and
+        # options_combo, by their key
+        self.__combo_indexes = {}
+        # Loader options applied to every search query
+        self.__query_options = []
         self._expand_tree_after_search = False
+        # Filter used by the last search and current sort (field, order)
+        self.__search_filter = None
+        self.__sort = None
+        self.__sort_in_database = False
+        # Keyset pagination: (key, inclusive) where current page starts, None
+        # for the first page, and the keys of first and last displayed rows
+        self.__page_start = None
+        self.__page_first_key = None
+        self.__page_last_key = None
+        self.__page_rows = 0
+        # Set to True to search while the user types on search field
+        self.incremental_search = False
+        self.__search_timeout = None
+        # Term (field, text) of last search, objects it returned, and the
+        # cache of a complete result as (field, text, objects)
+        self.__search_term = (None, '')
+        self.__result_objects = []
+        self.__search_cache = None
+        # Set to True to search through the search index of the database
+        # (see dawpag.search_index) instead of like('%text%')
+        self.use_search_index = False
+        # Set to True to run searches on a worker thread, delivering the
+        # results to the treeview in chunks
+        self.background_search = False
+        self.__search_worker = None
+        self.__search_pulse = None
+        self.__search_loaded = 0
+        # Number of SQL statements issued by the last search
+        self.search_statement_count = 0
+        self.__search_statement_start = 0
 
         # Call Ancestor constructor
         super(BaseController, self).__init__('controller.base_controller',\
@@ -84,6 +152,7 @@ class BaseController(BaseWindow):
         self.set_clicked_accel(self.base_bt_new_cancel, 'F2')
         self.set_clicked_accel(self.base_bt_edit_goback, 'F3')
         self.set_clicked_accel(self.base_bt_next_confirm, 'F4')
+        self.__setup_pagination()
 
         self.base_button_box.set_focus_chain([self.base_bt_next_confirm,
             self.base_bt_edit_goback,
@@ -103,18 +172,101 @@ class BaseController(BaseWindow):
         v1 = getattr(obj1, field)
         v2 = getattr(obj2, field)
         if v1 > v2:
-            return -1
-        elif v2 > v1:
             return 1
+        elif v2 > v1:
+            return -1
         else: return 0
 
 
-    def __tv_data_column_clicked(self, column, field):
+    def __tv_data_column_clicked(self, column, ix, field):
+        """
+        Manage how to sort the treeview when some column is clicked.
+        Small result sets are sorted in memory. When the result has been
+        truncated by database.query_limit, has more rows than
+        database.sort_threshold, or the model is lazy, the search is done again
+        ordered by the database on the column mapped to field. Lazy models can
+        not be sorted in memory, clicks on columns not mapped to a database
+        column are ignored
+        """
+        if self.__is_lazy_model() and self.__get_sort_column(field) is None:
+            return
+        order = gtk.SORT_ASCENDING
+        if self.__sort and self.__sort[0] == field:
+            if self.__sort[1] == gtk.SORT_ASCENDING:
+                order = gtk.SORT_DESCENDING
+        for col in self.base_tv_data.get_columns():
+            col.set_sort_indicator(col is column)
+        column.set_sort_order(order)
+        self.__sort = (field, order)
+        if self.__must_sort_in_database(field):
+            log.debug('sorting "%s" on database', field)
+            self.__sort_in_database = True
+            self.__page_start = None
+            # A fresh model, the current one may keep an in memory sort
+            if not self.__is_lazy_model():
+                self.__tree_model = self._get_tree_model()
+                self.base_tv_data.set_model(self.__tree_model)
+            self.__run_search(self.__search_filter)
+        else:
+            self.__sort_in_database = False
+            self.__tree_model.set_sort_func(ix, self.__tv_data_compare, field)
+            self.__tree_model.set_sort_column_id(ix, order)
+
+
+    def __must_sort_in_database(self, field):
+        """
+        Return True if current search results need to be sorted by database
+        """
+        if self.__get_sort_column(field) is None:
+            # Not a mapped column, can only be sorted in memory
+            return False
+        if self.__is_lazy_model():
+            return True
+        rows = len(self.__tree_model)
+        threshold = cfg.get_int('database.sort_threshold', 1000)
+        return self.__is_full_page(rows) or rows > threshold
+
+
+    def __get_search_column(self, query_model, field):
         """
-        Manage how to sort the treeview when some column is clicked
+        Return the column used to search or sort by field. a method named
+        _search_field_[FIELD] on search model can return another column
         """
-        sort_id = column.get_sort_column_id()
-        self.__tree_model.set_sort_func(sort_id, self.__tv_data_compare, field)
+        fld_func = '_search_field_%s' % field
+        if hasattr(query_model, fld_func):
+            return getattr(query_model, fld_func).__call__()
+        return getattr(query_model, field)
+
+
+    def __get_index_filter(self, query_model, field, text):
+        """
+        Return the criterion that searches text on field through the search
+        index, or None if the search must use LIKE
+        """
+        if not self.use_search_index or \
+            hasattr(query_model, '_search_field_%s' % field):
+            return None
+        index = search_index.get_index(query_model, field)
+        if index is None:
+            return None
+        return index.filter(text)
+
+
+    def __get_sort_column(self, field):
+        """
+        Return the column that orders the search by field, or None if field
+        is not mapped to a column
+        """
+        query_model = self._get_search_model()
+        if not hasattr(query_model, field):
+            return None
+        column = self.__get_search_column(query_model, field)
+        if isinstance(column, InstrumentedAttribute) and \
+            not isinstance(column.property, ColumnProperty):
+            return None
+        if not hasattr(column, 'asc'):
+            return None
+        return column
 
 
     def __setup_row_list(self):
@@ -160,22 +312,59 @@ class BaseController(BaseWindow):
                 if hasattr(self, data_func_name):
                     data_func = getattr(self, data_func_name)
                 col.set_cell_data_func(cr, data_func, field)
-            col.connect('clicked', self.__tv_data_column_clicked, field)
-            col.set_sort_column_id(ix)
+            col.connect('clicked', self.__tv_data_column_clicked, ix, field)
+            col.set_clickable(True)
             self.base_tv_data.append_column(col)
         self.__tree_model = self._get_tree_model()
+        if self.__is_lazy_model():
+            self.__set_fixed_sizing()
         #self.__tree_model.set_sort_func(self.__tv_data_compare_method)
         self.base_tv_data.set_model(self.__tree_model)
+        self.__query_options = self._get_query_options()
+
+
+    def __set_fixed_sizing(self):
+        """
+        Size the search columns without measuring rows. The treeview measures
+        every row of other models, reading the value of each one, which would
+        load every page of a LazyQueryModel. Columns not given a fixed width
+        get lazy_column_width, and all rows the height of the first one
+        """
+        for col in self.base_tv_data.get_columns():
+            col.set_sizing(gtk.TREE_VIEW_COLUMN_FIXED)
+            if col.get_fixed_width() <= 1:
+                col.set_fixed_width(self.lazy_column_width)
+        self.base_tv_data.set_fixed_height_mode(True)
 
 
     def _get_tree_model(self):
         """
         Return the default treemodel. if you want to create a TreeStore,
-        override and return a treestore instance
+        override and return a treestore instance.
+        For big tables override and return a LazyQueryModel instance, search
+        results will not be limited by database.query_limit and rows will be
+        loaded page by page while the list is scrolled
         """
         return gtk.ListStore(object)
 
 
+    def __is_lazy_model(self):
+        return isinstance(self.__tree_model, LazyQueryModel)
+
+
+    def __clear_rows(self):
+        """
+        Remove all rows of the treeview. A LazyQueryModel is replaced by a new
+        one, instead of removing its rows one by one
+        """
+        if self.__is_lazy_model():
+            self.base_tv_data.set_model(None)
+            self.__tree_model = self._get_tree_model()
+            self.base_tv_data.set_model(self.__tree_model)
+        else:
+            self.__tree_model.clear()
+
+
     def __setup_search(self):
         """
         Setup the search engine by creating field selections on select field
@@ -190,6 +379,103 @@ class BaseController(BaseWindow):
         self.base_cb_fields.add_attribute(cell, 'text', 1)
         self.base_cb_fields.set_model(item_list)
         self.base_cb_fields.set_active(self.default_search_column)
+        if self.incremental_search:
+            self.base_ed_search_field.connect('changed',
+                self.__on_search_text_changed)
+
+
+    def __on_search_text_changed(self, entry):
+        """
+        Restart the debounce window each time the search text changes, the
+        search runs only when the user stops typing
+        """
+        if self.__search_timeout is not None:
+            gobject.source_remove(self.__search_timeout)
+        delay = cfg.get_int('search.debounce_delay', 300)
+        self.__search_timeout = gobject.timeout_add(delay,
+            self.__on_search_timeout)
+
+
+    def __on_search_timeout(self):
+        self.__search_timeout = None
+        self.do_incremental_search()
+        # Returning False removes the timeout source
+        return False
+
+
+    def __get_search_term(self):
+        """
+        Return (field, text) to search for. field is None when the search text
+        is empty or no field is selected
+        """
+        search_text = self.base_ed_search_field.get_text()
+        if not u.isempty(search_text):
+            cb_model = self.base_cb_fields.get_model()
+            cb_active = self.base_cb_fields.get_active()
+            if cb_active >= 0:
+                return (cb_model[cb_active][0], search_text)
+        return (None, '')
+
+
+    def __store_search_cache(self):
+        """
+        Keep the objects of last search when they are the complete result of
+        the search term, in id order. Truncated, paged or database sorted
+        results can not be narrowed in memory
+        """
+        self.__search_cache = None
+        if (self.__is_lazy_model() or self.__tree_filter or
+            self.__page_start is not None or self.__sort_in_database):
+            return
+        if self.__is_full_page(len(self.__result_objects)):
+            return
+        field, text = self.__search_term
+        self.__search_cache = (field, text, self.__result_objects)
+
+
+    def __text_matcher(self, text):
+        """
+        Return a function that tells if a value matches like '%text%', with
+        the same case sensitiveness of the database LIKE operator
+        """
+        if get_engine().name in ('sqlite', 'mysql'):
+            text = text.lower()
+            return lambda v: v is not None and text in unicode(v).lower()
+        return lambda v: v is not None and text in unicode(v)
+
+
+    def __narrow_search_cache(self, field, text):
+        """
+        Display the cached objects that match the new search term. Return
+        False if the cached result can not be narrowed to the new term
+        """
+        if self.__search_cache is None:
+            return False
+        cached_field, cached_text, objects = self.__search_cache
+        if cached_text and cached_field != field:
+            return False
+        if cached_text not in text:
+            # The term was broadened, the cache does not hold all matches
+            return False
+        if hasattr(self._get_search_model(), '_search_field_%s' % field):
+            # Custom search column, can not be matched in memory
+            return False
+        if self.__class__._hack_filter.im_func is not \
+            BaseController._hack_filter.im_func:
+            # The controller changes the search filter, the cached objects
+            # can not be matched in memory the same way
+            return False
+        log.debug('narrowing cached search to "%s"', text)
+        match = self.__text_matcher(text)
+        objects = [o for o in objects if match(getattr(o, field))]
+        self.__clear_rows()
+        self.__add_objects(objects)
+        if objects:
+            self.base_tv_data.set_cursor((0,))
+        self.__search_term = (field, text)
+        self.__search_cache = (field, text, objects)
+        self.search_statement_count = 0
+        return True
 
 
     def __populate_view(self, force=False, **kwargs):
@@ -208,27 +494,16 @@ class BaseController(BaseWindow):
             if not self.__curr_obj:
                 self.__get_selected_object()
             self.__populated_with = self.__curr_obj
-            for f,w in self.__widget_fields:
-                value = None
-                if kwargs.get('new'):
-                    default_name = '_default_%s' % f
-                    if hasattr(self, default_name):
-                        value = getattr(self, default_name).__call__()
-                    else:
-                        attr = getattr(self.model, f)
-                        if isinstance(attr.property, ColumnProperty):
-                            col = attr.parententity.c[f]
-                            if col.default:
-                                arg = col.default.arg
-                                # TODO: manage some callable values too
-                                # For now just plain defaults
-                                if not callable(arg):
-                                    value = arg
+            new = kwargs.get('new')
+            for b in self.__bindings:
+                if new:
+                    value = b.default()
                 else:
-                    value = getattr(self.__curr_obj, f)
-                log.debug('POPULATE VIEW: populating %s with value %s'
-                    % (w.name, str(value)))
-                self.set_widget_value(w, None, None, value)
+                    value = getattr(self.__curr_obj, b.field)
+                if __debug__:
+                    log.debug('POPULATE VIEW: populating %s with value %s',
+                        b.widget.name, value)
+                self.__show_value(b.widget, b.kind, value, b.formatter)
             log.debug('view has been populated......')
             self._after_populate_view()
 
@@ -237,8 +512,7 @@ class BaseController(BaseWindow):
         """
         Get all widgets with name starting with "ed_" from view, than, crop the
         end of name and try to find a field with the same name on model, if
-        found add a tuple in self.__widget_fields with the field name and a
-        pointer to widget
+        found add a FieldBinding of the field and widget to self.__bindings
         """
         comps = self.get_components(self.data_prefixes)
         for c in comps:
@@ -246,28 +520,53 @@ class BaseController(BaseWindow):
             fname = c.name[3:]
             if hasattr(self.model, fname):
                 self.__set_widget_required(c, self.model, fname)
-                self.__widget_fields.append((fname,c))
                 at = getattr(self.model, fname)
                 if isinstance(c, gtk.ComboBox):
                     at = getattr(self.model, fname)
                     if isinstance(at.property, PropertyLoader):
                         cls = at.property.mapper.class_
-                        log.debug('Auto Setup a ComboBox forfield "%s"' % fname)
+                        if __debug__:
+                            log.debug('Auto Setup a ComboBox forfield "%s"',
+                                fname)
                         self.relation_combo(c, cls, cls._display_field)
-                else:
-                    c.connect('focus-out-event', self.__on_get_new_data, fname)
+                binding = FieldBinding(self, self.model, fname, c,
+                    self.__widget_kind(c))
+                self.__bindings.append(binding)
+                if not isinstance(c, gtk.ComboBox):
+                    c.connect('focus-out-event', self.__on_get_new_data,
+                        binding)
+
+
+    def __widget_kind(self, widget):
+        """
+        Return the WidgetKind of widget, that defines how its value is shown
+        and read
+        """
+        if isinstance(widget, gtk.ToggleButton):
+            return WidgetKind.TOGGLE
+        elif widget in self.__relation_completions:
+            return WidgetKind.COMPLETION
+        elif isinstance(widget, gtk.ComboBox):
+            if widget in self.__relation_combos:
+                return WidgetKind.RELATION
+            return WidgetKind.COMBO
+        elif isinstance(widget, gtk.TextView):
+            return WidgetKind.TEXTVIEW
+        elif isinstance(widget, (gtk.HBox, gtk.VBox)):
+            return WidgetKind.RADIO_BOX
+        return WidgetKind.ENTRY
 
 
-    def __get_widget_value(self, widget):
+    def __get_widget_value(self, widget, kind):
         # Test if a masked field exists
         masked_name = msk_masked % widget.name
         if hasattr(self, masked_name):
             m = getattr(self, masked_name)
             if m.is_empty():
                 return None
-        if isinstance(widget, gtk.ToggleButton):
+        if kind == WidgetKind.TOGGLE:
             return widget.get_active()
-        elif isinstance(widget, gtk.TextView):
+        elif kind == WidgetKind.TEXTVIEW:
             buff = widget.get_buffer()
             start, end = buff.get_bounds()
             return buff.get_text(start, end)
@@ -277,24 +576,6 @@ class BaseController(BaseWindow):
         return text
 
 
-    def __value_for_field(self, value, field, model=None):
-        if not model:
-            model = self.model
-        col_type = str
-        attr = getattr(model, field)
-        if isinstance(attr, InstrumentedAttribute):
-            col = attr.parententity.c[field]
-            col_type = col.type
-        # Convert value to a datetime value
-        if isinstance(col_type, DateTime):
-            # TODO: Identify if Column contain only time, or timestamps
-            return u.str_to_date(value)
-        elif isinstance(col_type, Numeric):
-            return decimal.Decimal(str(value))
-        log.debug(str(col_type))
-        return value
-
-
     def __set_widget_required(self, widget, model, field):
         if not hasattr(model, field):
              return
@@ -328,35 +609,26 @@ class BaseController(BaseWindow):
                         self.set_label_text(label, new, True)
 
 
-    def __set_field_value(self, field, value, model=None, obj=None):
+    def __set_field_value(self, field, value, model=None, obj=None,
+        setter=None):
         """
-        Get the value from given widget.
+        Set value to field of obj, through setter(obj, value) if given, as the
+        setter of a FieldBinding
         """
         if not model:
             model = self.model
         if not obj:
             obj = self.__curr_obj
-        attr = getattr(model, field)
-        col_type = str
-        if isinstance(attr, InstrumentedAttribute):
-            col = attr.parententity.c[field]
-            col_type = col.type
-        setter_method = "set_%s" % field
-        if hasattr(obj, setter_method):
-            log.debug("Setter method %s found for field %s. will set"
-                " callling it" % (setter_method, field))
-            getattr(obj, setter_method).__call__(value)
-        else:
-            v = getattr(obj, field)
-            log.debug("Setting value new:[%s] old:[%s] for field %s" %\
-                (value, v, field))
-            #log.debug("Types new:[%s] old:[%s]" % (type(value), type(v)))
-            setattr(obj, field, value)
+        if __debug__:
+            log.debug("Setting value new:[%s] for field %s", value, field)
+        if setter is None:
+            setter = get_field_info(model, field).set_value
+        setter(obj, value)
         self.__curr_obj_changed = True
         self._after_set_field_value(field, value, model, obj)
 
 
-    def __on_get_new_data(self, widget, event, field=None):
+    def __on_get_new_data(self, widget, event, binding):
         """
         Callback to be assosiated with every data related widget 'focus-out'
         event, than update self.__curr_obj field related to widget if
@@ -378,49 +650,54 @@ class BaseController(BaseWindow):
         #field = self.__get_field_from_widget(widget)
         if self.__curr_obj is None:
             return
+        field = binding.field
         old_value = getattr(self.__curr_obj, field)
-        new_value = self.__get_widget_value(widget)
-        new_value = self.__value_for_field(new_value, field)
-        log.debug("old: %s new: %s" % (str(old_value),str(new_value)))
+        new_value = binding.converter(self.__get_widget_value(widget,
+            binding.kind))
+        if __debug__:
+            log.debug("old: %s new: %s", old_value, new_value)
         if u.wasunchanged(new_value, old_value):
             return
-        validation_method = "_validate_%s" % field
         is_valid = True
         error = None
-        if hasattr(self, validation_method):
-            log.debug('will call validation method %s' % validation_method)
-            error = getattr(self, validation_method).__call__(new_value)
+        if binding.validator is not None:
+            log.debug('will call validation method for %s', field)
+            error = binding.validator(new_value)
             if isinstance(error, bool):
                 is_valid = error
             else:
                 is_valid = not isinstance(error, str)
         if is_valid:
-            self.__set_field_value(field, new_value)
+            self.__set_field_value(field, new_value, setter=binding.setter)
             log.debug('ON GET NEW DATA: set widget value')
-            self.set_widget_value(widget, self.__curr_obj, field)
+            self.__show_value(widget, binding.kind,
+                getattr(self.__curr_obj, field), binding.formatter)
         else:
-            log.debug('validation error with message: %s' % error)
+            log.debug('validation error with message: %s', error)
             # TODO: Make invalid field visible for user, and create a list
             # of invalid fields and the error returned on param "err"
             self.__has_invalid_data = True
 
 
-    def __on_get_custom_data(self, widget, event, fld=None, mdl=None, obj=None):
+    def __on_get_custom_data(self, widget, event, binding, mdl, obj=None):
         """
         A Custom data getter for widgets, working with a custom field, model
         and object
         """
         if not obj:
             return
+        fld = binding.field
         old_value = getattr(obj, fld)
-        new_value = self.__get_widget_value(widget)
-        new_value = self.__value_for_field(new_value, fld, mdl)
-        log.debug("old: %s new: %s" % (str(old_value),str(new_value)))
+        new_value = binding.converter(self.__get_widget_value(widget,
+            binding.kind))
+        if __debug__:
+            log.debug("old: %s new: %s", old_value, new_value)
         if u.wasunchanged(new_value, old_value):
             return
-        self.__set_field_value(fld, new_value, mdl, obj)
+        self.__set_field_value(fld, new_value, mdl, obj, binding.setter)
         log.debug('ON GET CUSTOM DATA: set widget value')
-        self.set_widget_value(widget, obj, fld)
+        self.__show_value(widget, binding.kind, getattr(obj, fld),
+            binding.formatter)
         # TODO: Create validation for custom data loader
 
 
@@ -431,8 +708,8 @@ class BaseController(BaseWindow):
             value = widget.name[offset:]
             log.debug(value)
             self.__set_field_value(field, value)
-            log.debug('Value changed to %s for field "%s" from radio' %
-                (field,value))
+            log.debug('Value changed to %s for field "%s" from radio',
+                field, value)
 
 
     def __get_combo_values(self):
@@ -481,7 +758,7 @@ class BaseController(BaseWindow):
                 self.__show_data_page()
             else:
                 self.__show_search_page()
-            log.debug('changed state to: %s' % [
+            log.debug('changed state to: %s', [
                 'INSERTING', 'BROWSING','EDITING'][new_state])
 
 
@@ -528,11 +805,40 @@ class BaseController(BaseWindow):
         iter = self.__tree_model.get_iter(cur[0])
         self.__set_state(DataState.BROWSING)
         obj = self.__tree_model.get_value(iter,0)
+        if isinstance(obj, PlaceholderRow):
+            # Row of a lazy model no longer in the query result
+            self.__set_current_object()
+            return cur
         cur_obj = self._hack_get_selected_object(obj)
         self.__set_current_object(cur_obj)
         return cur
 
 
+    def __on_cursor_settled(self):
+        """
+        Take the object selected on treeview, and show it if the data page is
+        visible
+        """
+        self.__cursor_idle = None
+        if self.base_tv_data.get_cursor()[0] is None:
+            # The list was cleared before the cursor settled
+            return False
+        self.__get_selected_object()
+        if self.base_nb_main.get_current_page() == 1:
+            self.__populate_view()
+        return False
+
+
+    def __flush_cursor_change(self):
+        """
+        Take the selected object now if a cursor change is waiting to be
+        handled
+        """
+        if self.__cursor_idle is not None:
+            gobject.source_remove(self.__cursor_idle)
+            self.__on_cursor_settled()
+
+
     def __set_current_object(self, obj=None):
         self._before_set_object()
         self.__curr_obj = obj
@@ -559,7 +865,7 @@ class BaseController(BaseWindow):
     def __date_entry_button_clicked(self, button, entry, callbk):
         # Create and Show Window
         from select_date_controller import SelectDateWindow
-        w = SelectDateWindow()
+        w = window_pool.acquire(SelectDateWindow)
         w.set_date(u.str_to_date(entry.get_text()))
         w.set_callback(callbk)
         w.show_window(entry, self.window)
@@ -577,14 +883,307 @@ class BaseController(BaseWindow):
             return self.__tree_model.append([obj])
 
 
+    def __add_objects(self, objects):
+        """
+        Add the queried objects to the treemodel. If controller defines a tree
+        relation, the descendants of each object are added under it to get a
+        treeview behavior
+        """
+        if self.__tree_filter:
+            self.__add_tree_objects(objects)
+        else:
+            for obj in objects:
+                self.__add_to_tree(obj)
+
+
+    def __add_tree_objects(self, roots):
+        """
+        Add roots and all their descendants to the treemodel.
+        Descendants are loaded level by level, with one query for each
+        TREE_BATCH_SIZE parents of a level, and the parent/child map is built in
+        memory before the nodes are added, instead of lazy loading the children
+        of every node
+        """
+        relation, column = self.__tree_filter[1], self.__tree_filter[2]
+        prop = class_mapper(self._get_search_model()).get_property(relation)
+        child_model = prop.mapper.class_
+        if not hasattr(child_model, column):
+            # Parent column is not mapped, walk the relation
+            for obj in roots:
+                self.__add_tree_relation(None, obj, relation)
+            return
+        parent_column = getattr(child_model, column)
+        iters = {}
+        level = []
+        for obj in roots:
+            iters[obj.id] = self.__add_to_tree(obj)
+            level.append(obj.id)
+        while level:
+            children = {}
+            for start in range(0, len(level), TREE_BATCH_SIZE):
+                query = session.query(child_model).filter(
+                    parent_column.in_(level[start:start + TREE_BATCH_SIZE]))
+                if prop.order_by:
+                    query = query.order_by(*prop.order_by)
+                else:
+                    query = query.order_by(child_model.id)
+                for child in query:
+                    children.setdefault(getattr(child, column), []).append(
+                        child)
+            next_level = []
+            for parent_id in level:
+                for child in children.get(parent_id, []):
+                    # Guard against cycles on inconsistent data
+                    if child.id in iters:
+                        continue
+                    iters[child.id] = self.__add_to_tree(child,
+                        iters[parent_id])
+                    next_level.append(child.id)
+            level = next_level
+
+
+    def __add_tree_relation(self, parent, obj, relation):
+        """
+        Add obj under parent, and its children walking the relation
+        """
+        parent_iter = self.__add_to_tree(obj, parent)
+        for child in getattr(obj, relation):
+            self.__add_tree_relation(parent_iter, child, relation)
+
+
+    def __build_query(self, filter_data=None, query_session=None, limit=True,
+        page_before=None):
+        """
+        Build the search query over query_session, or over the application
+        session if not given. if limit is False, the query is not limited by
+        database.query_limit.
+        The query starts at current page. if page_before is given, return the
+        query of the page that ends before that key, in descending order
+        """
+        if query_session is None:
+            query_session = session
+        query_model = self._get_search_model()
+        query = query_session.query(query_model)
+        for j in self._get_query_joins():
+            query = query.join(j)
+        if self.__query_options:
+            query = query.options(*self.__query_options)
+        if filter_data:
+            # FIXME: Workarround to get tree representation
+            # If has a treefilter add the filter to filter
+            if self.__tree_filter:
+                filter_data = and_(filter_data, self.__tree_filter[0])
+            query = query.filter(filter_data)
+        else:
+            # FIXME: Improve DRY query = query.filter is declared twice
+            if self.__tree_filter:
+                query = query.filter(self.__tree_filter[0])
+        if page_before is not None:
+            query = query.filter(query_model.id < page_before)
+            return query.order_by(query_model.id.desc()).limit(
+                cfg.get_int('database.query_limit'))
+        if limit and self.__page_start is not None:
+            key, inclusive = self.__page_start
+            if inclusive:
+                query = query.filter(query_model.id >= key)
+            else:
+                query = query.filter(query_model.id > key)
+        if self.__sort_in_database and self.__sort:
+            field, order = self.__sort
+            column = self.__get_sort_column(field)
+            if order == gtk.SORT_DESCENDING:
+                query = query.order_by(column.desc())
+            else:
+                query = query.order_by(column.asc())
+        query = query.order_by(query_model.id)
+        if limit:
+            query = query.limit(cfg.get_int('database.query_limit'))
+        return query
+
+
+    def __run_search(self, filter_data):
+        """
+        Query and display the search results for filter_data
+        """
+        self.__search_statement_start = statement_count()
+        self.__search_filter = filter_data
+        self.__page_first_key = None
+        self.__page_last_key = None
+        self.__page_rows = 0
+        self.__result_objects = []
+        self.__search_cache = None
+        if self.background_search and not self.__is_lazy_model():
+            self.__start_background_search(filter_data)
+        else:
+            self.query_data(filter_data=filter_data)
+            self.display_query_data()
+            self.search_statement_count = (statement_count() -
+                self.__search_statement_start)
+
+
+    def __setup_pagination(self):
+        """
+        Setup accelerators for page navigation buttons, if the view defines
+        them
+        """
+        if self.get_widget('base_bt_previous_page') is not None:
+            self.set_clicked_accel(self.base_bt_previous_page, 'ctrl-Page_Up',
+                False)
+        if self.get_widget('base_bt_next_page') is not None:
+            self.set_clicked_accel(self.base_bt_next_page, 'ctrl-Page_Down',
+                False)
+
+
+    def __can_paginate(self):
+        """
+        Pages are sought by id, lazy models show all rows without pages
+        """
+        return not self.__is_lazy_model()
+
+
+    def __is_full_page(self, rows):
+        """
+        Return True if rows reach database.query_limit, so the result may have
+        been truncated. Without a limit configured results are never
+        truncated
+        """
+        limit = cfg.get_int('database.query_limit')
+        return limit is not None and rows >= limit
+
+
+    def __has_next_page(self):
+        return (self.__can_paginate() and self.__page_last_key is not None and
+            self.__is_full_page(self.__page_rows))
+
+
+    def __has_previous_page(self):
+        return self.__can_paginate() and self.__page_start is not None
+
+
+    def __track_page_key(self, obj):
+        """
+        Keep track of the keys of first and last rows of current page
+        """
+        if self.__page_first_key is None:
+            self.__page_first_key = obj.id
+        self.__page_last_key = obj.id
+        self.__page_rows += 1
+
+
+    def __update_page_buttons(self):
+        for name, enabled in (('base_bt_previous_page',
+            self.__has_previous_page()), ('base_bt_next_page',
+            self.__has_next_page())):
+            button = self.get_widget(name)
+            if button is not None:
+                button.set_sensitive(enabled)
+
+
+    def __reset_database_sort(self):
+        """
+        Pages follow the id order, so a database sort by other column is
+        dropped when navigating through pages
+        """
+        if self.__sort_in_database:
+            self.__sort_in_database = False
+            self.__sort = None
+            for col in self.base_tv_data.get_columns():
+                col.set_sort_indicator(False)
+
+
+    def __stream_chunk_size(self):
+        """
+        Number of rows fetched from database cursor at a time when streaming
+        search results
+        """
+        return cfg.get_int('database.stream_chunk_size', 100)
+
+
+    def __start_background_search(self, filter_data):
+        """
+        Cancel the search in progress, if any, and start a new one on a worker
+        thread. Results are added to treeview as they arrive
+        """
+        self.do_cancel_search()
+        self.__clear_rows()
+        self.__search_loaded = 0
+        chunk_size = self.__stream_chunk_size()
+        self.__search_worker = QueryWorker(
+            lambda s: self.__build_query(filter_data, s).yield_per(chunk_size),
+            self.__on_search_chunk, self.__on_search_finished, chunk_size)
+        self.__show_search_progress(True)
+        self.__search_worker.start()
+
+
+    def __on_search_chunk(self, worker, objects):
+        """
+        Receive a chunk of detached objects from search worker, merge them into
+        application session and add them to treeview
+        """
+        if worker is not self.__search_worker:
+            return
+        first_chunk = self.__search_loaded == 0
+        objects = merge_results(objects)
+        self.__add_objects(objects)
+        for obj in objects:
+            self.__track_page_key(obj)
+            self.__result_objects.append(obj)
+        self.__search_loaded += len(objects)
+        progress = self.get_widget('base_pb_search')
+        if progress is not None:
+            progress.set_text(_(u'%d registros') % self.__search_loaded)
+        if first_chunk and objects:
+            self.base_tv_data.set_cursor((0,))
+
+
+    def __on_search_finished(self, worker, error):
+        if worker is not self.__search_worker:
+            return
+        self.__search_worker = None
+        # The search ran on the worker thread, its statements are counted there
+        self.search_statement_count = worker.statement_count
+        self.__show_search_progress(False)
+        self.__update_page_buttons()
+        if error is None:
+            self.__store_search_cache()
+        if error is not None:
+            self.message_error(_(u'Erro ao executar a pesquisa:\n%s') %
+                u.escape_markup(str(error)))
+
+
+    def __pulse_search_progress(self, progress):
+        if self.__search_worker is None:
+            self.__search_pulse = None
+            return False
+        progress.pulse()
+        return True
+
+
+    def __show_search_progress(self, visible):
+        """
+        Show or hide the search progress indicator, if the view provides one
+        """
+        box = self.get_widget('base_hb_search_progress')
+        progress = self.get_widget('base_pb_search')
+        if box is None or progress is None:
+            return
+        if visible:
+            progress.set_text('')
+            box.show()
+            if self.__search_pulse is None:
+                self.__search_pulse = gobject.timeout_add(100,
+                    self.__pulse_search_progress, progress)
+        else:
+            box.hide()
+
+
     # Private Methods
 
     def _connect_custom_data_widgets(self, components, model, obj):
         """
         Get all widgets with name starting with "ed_" from view, than, crop the
         end of name and try to find a field with the same name on model, if
-        found add a tuple in self.__widget_fields with the field name and a
-        pointer to widget
+        found connect the widget to the field of obj
         """
         # Disconnect all first connected signals
         for w, h in self.__custom_signal_handlers:
@@ -602,12 +1201,18 @@ class BaseController(BaseWindow):
                     at = getattr(model, fname)
                     if isinstance(at.property, PropertyLoader):
                         cls = at.property.mapper.class_
-                        log.debug('Auto Setup a ComboBox forfield "%s"' % fname)
+                        if __debug__:
+                            log.debug('Auto Setup a ComboBox forfield "%s"',
+                                fname)
                         self.relation_combo(c, cls, cls._display_field)
                 else:
-                    log.debug('connected custom focus-out-event to %s' % c.name)
+                    if __debug__:
+                        log.debug('connected custom focus-out-event to %s',
+                            c.name)
+                    binding = FieldBinding(self, model, fname, c,
+                        self.__widget_kind(c))
                     han = c.connect('focus-out-event',
-                        self.__on_get_custom_data, fname, model, obj)
+                        self.__on_get_custom_data, binding, model, obj)
                     self.__custom_signal_handlers.append((c,han))
 
 
@@ -651,7 +1256,7 @@ class BaseController(BaseWindow):
         """
         obj = model.get_value(iter, 0)
         value = getattr(obj, field_name)
-        cell.set_property("active", value)
+        cell.set_property("active", bool(value))
 
 
     def _draw_data_func_pixbuf(self, column, cell, model, iter, field_name):
@@ -704,7 +1309,7 @@ class BaseController(BaseWindow):
     # override
     def _init_child_window(self):
         # Get the glade file for controller data
-        w_tree = gtk.glade.XML(u.get_glade_file(self.__module__))
+        w_tree = glade_cache.new_tree(self.__module__)
         # Get the toplevel window with name of current controller
         dw = w_tree.get_widget(self.__class__.__name__)
         place = self.dw_placeholder.get_parent()
@@ -719,6 +1324,19 @@ class BaseController(BaseWindow):
         self._connect_events(w_tree)
 
 
+    # override
+    def _connect_events(self, tree):
+        super(BaseController, self)._connect_events(tree)
+        if tree.get_widget('BaseWindow') is not self.window:
+            return
+        handlers = glade_cache.get_handlers(tree)
+        if handlers is None or 'on_BaseWindow_delete_event' not in handlers:
+            # base_controller.glade does not bind delete_event, closing by
+            # window manager must go through do_close too
+            self.window.connect('delete-event',
+                self.on_BaseWindow_delete_event)
+
+
     # override
     def _update_view(self):
         """
@@ -786,6 +1404,24 @@ class BaseController(BaseWindow):
         return []
 
 
+    def _get_query_options(self):
+        """
+        Return the loader options applied to search queries. By default the
+        many-to-one relations shown as search columns are eager loaded, so
+        drawing a page of rows does not lazy load each related object.
+        Override this method to load relations in another way
+        """
+        mapper = class_mapper(self._get_search_model())
+        options = []
+        for field, title in self.__search_fields:
+            prop = mapper.get_property(field, raiseerr=False)
+            # Collections are not eager loaded, they would multiply the rows
+            # of a limited, streamed query
+            if isinstance(prop, PropertyLoader) and not prop.uselist:
+                options.append(eagerload(field))
+        return options
+
+
     def _get_combo_active_model(self, combo):
         """
         Return the active index, and the model of given combobox
@@ -796,10 +1432,21 @@ class BaseController(BaseWindow):
     def _get_combo_selected_object(self, combo):
         """
         Return the selected object or None, for the given combo.
-        Note: this combo need to be a model with the object at first column
+        Note: this combo need to be a model with the object at first column,
+        or a combo created by relation_combo, whose first column holds ids
         """
+        if combo in self.__relation_completions:
+            completion = self.__relation_completions[combo]
+            obj_id = completion.get_selected_id()
+            if obj_id is None:
+                return None
+            return session.query(completion.model).get(obj_id)
         ix, mdl = self._get_combo_active_model(combo)
         if ix >= 0:
+            if combo in self.__relation_combos:
+                # Usually found on session identity map, without a query
+                return session.query(self.__relation_combos[combo]).get(
+                    mdl[ix][0])
             return mdl[ix][0]
         return None
 
@@ -849,7 +1496,7 @@ class BaseController(BaseWindow):
         Override this method to get access to make some stuff just before the
         new object is created
         """
-        log.debug('[callback] %s: _before_new' % self.__class__.__name__)
+        log.debug('[callback] %s: _before_new', self.__class__.__name__)
 
 
     def _after_new(self, obj):
@@ -857,7 +1504,7 @@ class BaseController(BaseWindow):
         Override this method to get access to current_object after new object
         is created for insert
         """
-        log.debug('[callback] %s: _after_new' % self.__class__.__name__)
+        log.debug('[callback] %s: _after_new', self.__class__.__name__)
 
 
     def _after_edit(self, obj):
@@ -865,7 +1512,7 @@ class BaseController(BaseWindow):
         Override this method to get access to current_object after new object
         is created for insert
         """
-        log.debug('[callback] %s: _after_edit' % self.__class__.__name__)
+        log.debug('[callback] %s: _after_edit', self.__class__.__name__)
 
 
     def _before_cancel(self, obj):
@@ -874,7 +1521,7 @@ class BaseController(BaseWindow):
         decide if continue canceling or abort cancelig by returning True or
         False
         """
-        log.debug('[callback] %s: _before_cancel' % self.__class__.__name__)
+        log.debug('[callback] %s: _before_cancel', self.__class__.__name__)
         return True
 
 
@@ -885,7 +1532,7 @@ class BaseController(BaseWindow):
         if last state was an insert, obj will be None, else will contain the
         original object with any modifications canceled
         """
-        log.debug('[callback] %s: _after_cancel' % self.__class__.__name__)
+        log.debug('[callback] %s: _after_cancel', self.__class__.__name__)
 
 
     def _before_save(self, obj):
@@ -894,7 +1541,7 @@ class BaseController(BaseWindow):
         object. to continue saving you need to return True, to abort saving
         just return False
         """
-        log.debug('[callback] %s: _before_save' % self.__class__.__name__)
+        log.debug('[callback] %s: _before_save', self.__class__.__name__)
         return True
 
 
@@ -902,21 +1549,21 @@ class BaseController(BaseWindow):
         """
         This method is called after the record is saved to database
         """
-        log.debug('[callback] %s: _after_save' % self.__class__.__name__)
+        log.debug('[callback] %s: _after_save', self.__class__.__name__)
 
 
     def _show_data_page(self):
         """
         Override this method to take the event occurred on data page is shown
         """
-        log.debug('[callback] %s: _show_data_page' % self.__class__.__name__)
+        log.debug('[callback] %s: _show_data_page', self.__class__.__name__)
 
 
     def _show_search_page(self):
         """
         Override this method to take the event occured on search page is shown
         """
-        log.debug('[callback] %s: _show_data_page' % self.__class__.__name__)
+        log.debug('[callback] %s: _show_data_page', self.__class__.__name__)
 
 
     def _remove_object(self, obj, expunge_only=True):
@@ -941,7 +1588,7 @@ class BaseController(BaseWindow):
         """
         Set the column agrupator for a tree representation as the given column
         """
-        self.__tree_filter = ('%s IS NULL' % column, relation)
+        self.__tree_filter = ('%s IS NULL' % column, relation, column)
 
 
     def message_info(self, message):
@@ -986,7 +1633,28 @@ class BaseController(BaseWindow):
         """
         # Before Close remove the current object from session if a new object
         self._remove_object(self.__curr_obj)
-        self.window.destroy()
+        self.do_cancel_search()
+        if self.__cursor_idle is not None:
+            gobject.source_remove(self.__cursor_idle)
+            self.__cursor_idle = None
+        if self.pooled:
+            self.__reset_for_reuse()
+            self.window.hide()
+            controller_pool.release(self)
+        else:
+            self.window.destroy()
+
+
+    def __reset_for_reuse(self):
+        """
+        Bring a closed pooled window back to browsing state, without current
+        object
+        """
+        if self._check_state(DataState.EDITING) and session.dirty:
+            session.rollback()
+        self.__set_current_object()
+        self.__populated_with = None
+        self.__set_state(DataState.BROWSING)
 
 
     def do_new(self):
@@ -994,6 +1662,7 @@ class BaseController(BaseWindow):
         Create a new object to be inserted in database
         """
         log.debug('DO_NEW')
+        self.__flush_cursor_change()
         self._before_new()
         new_obj = self.model()
         session.add(new_obj)
@@ -1008,6 +1677,7 @@ class BaseController(BaseWindow):
         Create a new object to be inserted in database
         """
         log.debug('DO_EDIT')
+        self.__flush_cursor_change()
         self.__populate_view()
         self.__set_state(DataState.EDITING)
         self._after_edit(self.__curr_obj)
@@ -1017,6 +1687,7 @@ class BaseController(BaseWindow):
         """
         Cancel the current object insert or editing
         """
+        self.__flush_cursor_change()
         if self.__confirm_data_loss():
             if self._before_cancel(self.__curr_obj):
                 if self._check_state(DataState.INSERTING):
@@ -1036,6 +1707,7 @@ class BaseController(BaseWindow):
         Save current modifications
         """
         log.debug('DO_SAVE')
+        self.__flush_cursor_change()
         if self._before_save(self.__curr_obj):
             #try:
             redo_search = False
@@ -1048,6 +1720,8 @@ class BaseController(BaseWindow):
                 else:
                     redo_search = True
             session.commit()
+            lookup_cache.invalidate(self.__curr_obj.__class__)
+            self.invalidate_search_cache()
             self.__set_state(DataState.BROWSING)
             if redo_search:
                 self.do_search()
@@ -1064,15 +1738,19 @@ class BaseController(BaseWindow):
         object
         """
         log.debug('DO_DELETE')
+        self.__flush_cursor_change()
         if not self._check_state(DataState.INSERTING):
             if confirm and (not self.__confirm_delete()):
                 return
             path, ot = self.__get_selected_object()
             iter = self.__tree_model.get_iter(path)
             self.__tree_model.remove(iter)
+            deleted_class = self.__curr_obj.__class__
             session.delete(self.__curr_obj)
             self.__set_current_object()
             session.commit()
+            lookup_cache.invalidate(deleted_class)
+            self.invalidate_search_cache()
             # Set position to previous row
             row = path[0]-1
             if row <=0:
@@ -1085,49 +1763,147 @@ class BaseController(BaseWindow):
         Execute a database search based on current search settings
         """
         log.debug('DO_SEARCH')
+        # Every new search starts at the first page
+        self.__page_start = None
         new_filter = None
         filter_field = None
         query_model = self._get_search_model()
-        search_text = self.base_ed_search_field.get_text()
-        if not u.isempty(search_text):
-            cb_model = self.base_cb_fields.get_model()
-            cb_active = self.base_cb_fields.get_active()
-            if cb_active >= 0:
-                field = cb_model[cb_active][0]
-                fld_func = '_search_field_%s' % field
-                if hasattr(query_model, fld_func):
-                    filter_field = getattr(query_model, fld_func).__call__()
-                else:
-                    filter_field = getattr(query_model, field)
-                new_filter=filter_field.like('%'+search_text+'%')
-                # If user want to hack the current filter on controller
+        field, search_text = self.__get_search_term()
+        self.__search_term = (field, search_text)
+        if field is not None:
+            filter_field = self.__get_search_column(query_model, field)
+            new_filter = self.__get_index_filter(query_model, field,
+                search_text)
+            if new_filter is None:
+                new_filter=filter_field.like(
+                    '%' + u.escape_like(search_text) + '%',
+                    escape=u.LIKE_ESCAPE)
+        # If user want to hack the current filter on controller
         new_filter = self._hack_filter(new_filter, filter_field,
             query_model)
-        self.query_data(filter_data=new_filter)
-        self.display_query_data()
+        self.__run_search(new_filter)
 
 
-    def query_data(self, filter_data=None):
+    def do_refresh(self):
         """
-        Query database from data and filter vy filter_data if filter is not none
+        Bring the list up to date without searching again: rows of objects
+        deleted since they were listed are removed, rows are redrawn with
+        current values, and if the page is not full the objects inserted after
+        its last row are appended. Lists that can not be refreshed this way
+        (lazy, tree, database sorted, or still loading) are searched again
         """
+        if (self.__is_lazy_model() or self.__tree_filter or
+            self.__sort_in_database or self.__search_worker is not None or
+            not isinstance(self.__tree_model, gtk.ListStore)):
+            self.do_search()
+            return
+        log.debug('DO_REFRESH')
+        self.__search_statement_start = statement_count()
+        model = self.__tree_model
+        it = model.get_iter_first()
+        while it:
+            if object_session(model.get_value(it, 0)) is None:
+                # Deleted or expunged since it was listed, remove moves the
+                # iter to next row
+                if not model.remove(it):
+                    it = None
+            else:
+                it = model.iter_next(it)
+        self.__result_objects = [row[0] for row in model]
+        self.__page_rows = len(self.__result_objects)
+        if not self.__is_full_page(self.__page_rows):
+            query = self.__build_query(self.__search_filter, limit=False)
+            if self.__page_last_key is not None:
+                query = query.filter(
+                    self._get_search_model().id > self.__page_last_key)
+            limit = cfg.get_int('database.query_limit')
+            if limit is not None:
+                query = query.limit(limit - self.__page_rows)
+            for obj in query:
+                self.__add_to_tree(obj)
+                self.__track_page_key(obj)
+                self.__result_objects.append(obj)
+        self.base_tv_data.queue_draw()
+        if self.__result_objects and self.base_tv_data.get_cursor()[0] is None:
+            self.base_tv_data.set_cursor((0,))
+        self.__update_page_buttons()
+        self.__store_search_cache()
+        self.search_statement_count = (statement_count() -
+            self.__search_statement_start)
+
+
+    def do_incremental_search(self):
+        """
+        Search for the current search term. When the term only extends the
+        term of the previous complete search, the cached result is narrowed in
+        memory, otherwise the search goes to database
+        """
+        field, text = self.__get_search_term()
+        if (self.__search_worker is None and self.__page_start is None and
+            field is not None and self.__narrow_search_cache(field, text)):
+            return
+        self.do_search()
+
+
+    def invalidate_search_cache(self):
+        """
+        Discard the cached search result, next search will query database
+        """
+        self.__search_cache = None
+
+
+    def do_next_page(self):
+        """
+        Display the next page of current search, starting after the last
+        displayed id. Deep pages cost the same as the first one
+        """
+        if not self.__has_next_page():
+            return
+        log.debug('DO_NEXT_PAGE')
+        self.__reset_database_sort()
+        self.__page_start = (self.__page_last_key, False)
+        self.__run_search(self.__search_filter)
+
+
+    def do_previous_page(self):
+        """
+        Display the previous page of current search. The ids of the page that
+        ends before the first displayed id are sought backwards, then the page
+        is displayed starting at the lowest of them
+        """
+        if not self.__has_previous_page() or self.__page_first_key is None:
+            return
+        log.debug('DO_PREVIOUS_PAGE')
+        self.__reset_database_sort()
         query_model = self._get_search_model()
-        query = session.query(query_model)
-        for j in self._get_query_joins():
-            query = query.join(j)
-        if filter_data:
-            # FIXME: Workarround to get tree representation
-            # If has a treefilter add the filter to filter
-            if self.__tree_filter:
-                filter_data = and_(filter_data, self.__tree_filter[0])
-            query = query.filter(filter_data)
+        query = self.__build_query(self.__search_filter,
+            page_before=self.__page_first_key)
+        keys = [row[0] for row in query.values(query_model.id)]
+        if keys and self.__is_full_page(len(keys)):
+            self.__page_start = (keys[-1], True)
         else:
-            # FIXME: Improve DRY query = query.filter is declared twice
-            if self.__tree_filter:
-                query = query.filter(self.__tree_filter[0])
+            self.__page_start = None
+        self.__run_search(self.__search_filter)
+
+
+    def do_cancel_search(self):
+        """
+        Cancel the background search in progress, if any. Rows already
+        delivered are kept on treeview
+        """
+        if self.__search_worker is not None:
+            log.debug('DO_CANCEL_SEARCH')
+            self.__search_worker.cancel()
+            self.__search_worker = None
+            self.__show_search_progress(False)
+
 
-        self.__query_data = query.order_by(
-            query_model.id).limit(cfg.get('database.query_limit'))
+    def query_data(self, filter_data=None):
+        """
+        Query database from data and filter vy filter_data if filter is not none
+        """
+        self.__query_data = self.__build_query(filter_data,
+            limit=not self.__is_lazy_model())
         return self.__query_data
 
 
@@ -1135,13 +1911,38 @@ class BaseController(BaseWindow):
         # Get the value if not passed
         if obj:
             value = getattr(obj, field)
+        self.__show_value(w, self.__widget_kind(w), value,
+            lambda v: self._format_widget_value(w.name, v))
+
+
+    def _format_widget_value(self, widget_name, value):
+        """
+        Return value formated as text for the entry named widget_name
+        """
+        # TODO: Move this format to _get_formated_value
+        if isinstance(value, datetime):
+            return u.date_to_str(value)
+        return self._get_formated_value(widget_name, value)
+
+
+    def __show_value(self, w, kind, value, formatter):
+        """
+        Show value on widget w of given WidgetKind, formatter returns the text
+        shown by entries
+        """
         # A boolean Value should be set to a togle button
-        if isinstance(w, gtk.ToggleButton):
+        if kind == WidgetKind.TOGGLE:
             w.set_active(value or False)
+        elif kind == WidgetKind.COMPLETION:
+            self.__relation_completions[w].set_selected(value)
         # A Combobox should select correct object by iteracting
-        elif isinstance(w, gtk.ComboBox):
+        elif kind in (WidgetKind.COMBO, WidgetKind.RELATION):
             mdl = w.get_model()
-            if mdl:
+            if kind == WidgetKind.RELATION and value is not None:
+                value = value.id
+            if w in self.__combo_indexes:
+                self.__combo_indexes[w].select(value)
+            elif mdl:
                 it = mdl.get_iter_first()
                 while it:
                     obj = mdl.get_value(it,0)
@@ -1149,51 +1950,62 @@ class BaseController(BaseWindow):
                         w.set_active_iter(it)
                         break
                     it = mdl.iter_next(it)
-        elif isinstance(w, gtk.TextView):
+        elif kind == WidgetKind.TEXTVIEW:
             buff = w.get_buffer()
-            buff.set_text(str(value or ''))
-        elif isinstance(w, (gtk.HBox, gtk.VBox)):
+            text = str(value or '')
+            start, end = buff.get_bounds()
+            if buff.get_text(start, end) != text:
+                buff.set_text(text)
+        elif kind == WidgetKind.RADIO_BOX:
             fname = w.name[3:]
             radio_button = self.get_widget('rb_%s_%s' % (fname, value))
             if radio_button:
                 radio_button.set_active(True)
         else:
-            # TODO: Move this format to _get_formated_value
-            if isinstance(value, datetime):
-                value = u.date_to_str(value)
-            else:
-                log.debug('FORMATED')
-                value = self._get_formated_value(w.name, value)
-            log.debug('WILL SET TEXT FOR %s %s' % (w.name, value))
-            w.set_text(value)
+            value = formatter(value)
+            # Skip unchanged text, setting it emits changed and redraws
+            if w.get_text() != value:
+                if __debug__:
+                    log.debug('WILL SET TEXT FOR %s %s', w.name, value)
+                w.set_text(value)
 
 
     def display_query_data(self):
         """
         Display on TreeView the data got by query_data method and stored on
-        self.__query_data
-        """
-        ## inner adjacency list generator for trees ----------------------------
-        def add_objects(parent, obj, relation):
-            rel = getattr(obj, relation)
-            parent_iter = self.__add_to_tree(obj, parent)
-            for child in rel:
-                add_objects(parent_iter, child, relation)
-        ##----------------------------------------------------------------------
-        # Test if controller defines a tree_group_column, if yes, track parent
-        # and child object to get a treeview behavior
-        relation = None
-        if self.__tree_filter:
-            relation = self.__tree_filter[1]
-        self.__tree_model.clear()
-        if self.__query_data.count() > 0:
-            if relation is not None:
-                func = lambda o: add_objects(None, o, relation)
-            else:
-                func = lambda o: self.__add_to_tree(o)
-            [func(obj) for obj in self.__query_data]
+        self.__query_data.
+        The query is executed once and its rows are streamed to the treeview,
+        the number of rows is known only after the stream is consumed
+        """
+        if self.__is_lazy_model():
+            # Detach the model while the query changes, so the view reads
+            # the new row count when attached again
+            self.base_tv_data.set_model(None)
+            self.__tree_model.set_query(self.__query_data)
+            self.base_tv_data.set_model(self.__tree_model)
+            if len(self.__tree_model) > 0:
+                self.base_tv_data.set_cursor((0,))
+            return
+        self.__clear_rows()
+        chunk_size = self.__stream_chunk_size()
+        rows = 0
+        chunk = []
+        for obj in self.__query_data.yield_per(chunk_size):
+            chunk.append(obj)
+            self.__track_page_key(obj)
+            self.__result_objects.append(obj)
+            rows += 1
+            if len(chunk) >= chunk_size:
+                self.__add_objects(chunk)
+                chunk = []
+        if chunk:
+            self.__add_objects(chunk)
+        if rows > 0:
             # set the first item of treeview
             self.base_tv_data.set_cursor((0,))
+        self.__update_page_buttons()
+        self.__store_search_cache()
+        return rows
 
 
     def options_box(self, box, field):
@@ -1203,7 +2015,8 @@ class BaseController(BaseWindow):
         for c in box.get_children():
             if isinstance(c, gtk.RadioButton):
                 c.connect('toggled', self.__radio_button_toggled, field)
-                log.debug('connected group changed callback for %s' % field)
+                if __debug__:
+                    log.debug('connected group changed callback for %s', field)
 
 
     def gtkEntry(self, name=None, _max=0):
@@ -1236,6 +2049,7 @@ class BaseController(BaseWindow):
         """
         combo = super(BaseController, self).options_combo(combo, options,
             default)
+        self.__combo_indexes[combo] = ComboIndex(combo)
         # If need to connect direct to auto changed with field
         if autoconnect:
             field_name = combo.name[3:]
@@ -1269,18 +2083,34 @@ class BaseController(BaseWindow):
 
     def relation_combo(self, combo, model, field, default=None):
         """
-        Create a combobox object related to a foreign model
+        Create a combobox object related to a foreign model.
+        The combo holds the (id, label) options of dawpag.lookup_cache, the
+        selected object is loaded by _get_combo_selected_object.
+        Note: the first column of the combo model holds the id of each object,
+        not the object as in previous versions. Code reading
+        combo.get_model()[path][0] must load the object by id, or use
+        _get_combo_selected_object
         """
-        log.debug('Setting a combobox connected to model "%s" and field "%s"' %
-            (model.__name__, field))
+        log.debug('Setting a combobox connected to model "%s" and field "%s"',
+            model.__name__, field)
         field_name = combo.name[3:]
+        if field_name in self.lazy_relations:
+            if isinstance(combo, gtk.ComboBoxEntry):
+                completion = RelationCompletion(combo, model, field,
+                    lambda c: self.__combo_changed(c, field_name))
+                completion.set_selected(default)
+                self.__relation_completions[combo] = completion
+                return
+            log.warning('lazy relation "%s" needs a ComboBoxEntry' %
+                field_name)
         item_list = gtk.ListStore(object, str)
-        obj_list = session.query(model).all()
         default_id = -1
-        for ix, obj in enumerate(obj_list):
-            item_list.append([obj, getattr(obj, field)])
-            if default == obj:
+        for ix, option in enumerate(lookup_cache.get_options(model, field)):
+            item_list.append(list(option))
+            if default is not None and default.id == option[0]:
                 default_id = ix
+        self.__relation_combos[combo] = model
+        self.__combo_indexes[combo] = ComboIndex(combo)
         cell = gtk.CellRendererText()
         combo.pack_start(cell, True)
         combo.add_attribute(cell, 'text', 1)
@@ -1330,9 +2160,23 @@ class BaseController(BaseWindow):
     def on_base_tv_data_cursor_changed(self, data=None):
         """
         The Cursor of TreeView was changed.
-        get tue cursor, get the object related and set self.__curr_obj
+        The object related to cursor is set as self.__curr_obj when the main
+        loop is idle, so moving the cursor through many rows takes only the
+        row where it stops
         """
-        self.__get_selected_object()
+        if self.__cursor_idle is None:
+            self.__cursor_idle = gobject.idle_add(self.__on_cursor_settled)
+
+
+    def on_base_nb_main_switch_page(self, notebook, page, page_num,
+        data=None):
+        """
+        Show the current object when the data page becomes visible
+        """
+        if page_num == 1:
+            self.__flush_cursor_change()
+            if self.__curr_obj is not None:
+                self.__populate_view()
 
 
     def on_base_tv_data_button_press_event(self, treeview, event, data=None):
@@ -1376,6 +2220,27 @@ class BaseController(BaseWindow):
         self.do_search()
 
 
+    def on_base_bt_search_cancel_clicked(self, widget, data=None):
+        """
+        Call when button to cancel the search in progress is clicked
+        """
+        self.do_cancel_search()
+
+
+    def on_base_bt_previous_page_clicked(self, widget, data=None):
+        """
+        Call when button previous page is clicked
+        """
+        self.do_previous_page()
+
+
+    def on_base_bt_next_page_clicked(self, widget, data=None):
+        """
+        Call when button next page is clicked
+        """
+        self.do_next_page()
+
+
     def on_base_bt_close_clicked(self, data=None):
         """
         Close the Window
@@ -1388,7 +2253,9 @@ class BaseController(BaseWindow):
         if self.__can_close():
             log.debug('delete event')
             self.do_close()
-            return False # False mean yes, we can close
+            # False mean yes, we can close. A pooled window was hidden by
+            # do_close and must not be destroyed
+            return self.pooled
         return True
 
 
@@ -22,6 +22,9 @@
 import gtk, gtk.glade
 import dawpag.utils as u
 from dawpag import basedir
+from dawpag.python import ClassInittableMetaType
+from dawpag import glade_cache
+from dawpag.ui.widget_index import WidgetIndex
 #import gtk.keysyms as gtkey
 
 
@@ -31,6 +34,15 @@ class BaseWindow(object):
     """
     A simple window based in a glade file
     """
+    __metaclass__ = ClassInittableMetaType
+
+    #@classmethod
+    def __class_init__(cls, ns):
+        # Names of the event handlers of class, computed once per class
+        cls._event_handlers = frozenset(filter(lambda x:x.startswith("on_"),
+            dir(cls)))
+    __class_init__ = classmethod(__class_init__)
+
     # Magic Methods
     def __init__(self, glade_file=None, window_name=None):
         """
@@ -42,6 +54,8 @@ class BaseWindow(object):
         """
         # Store a list of widget trees in this Window
         self.__w_trees = []
+        # Widgets of all trees by name and name prefix
+        self.__w_index = WidgetIndex()
         self.__accelerators = []
 
         # List of tuples containing widget name and format
@@ -51,7 +65,7 @@ class BaseWindow(object):
             g_file = glade_file
         else:
             g_file = self.__module__
-        w_tree = gtk.glade.XML(u.get_glade_file(g_file))
+        w_tree = glade_cache.new_tree(g_file)
         if window_name is not None:
             w_name = window_name
         else:
@@ -187,6 +201,7 @@ class BaseWindow(object):
         inside that tree can be accessed by "self.[widget_name]"
         """
         self.__w_trees.append(tree)
+        self.__w_index.add_tree(tree)
 
 
     def _init_child_window(self):
@@ -216,10 +231,15 @@ class BaseWindow(object):
         """
         Connect event signals to handlers
         """
+        names = self._event_handlers
+        # Bind only the handlers used by the glade file of tree
+        signals = glade_cache.get_handlers(tree)
+        if signals is not None:
+            names = names.intersection(signals)
         handlers = {}
-        for h in filter(lambda x:x.startswith("on_"), dir(self.__class__)):
+        for h in names:
             handlers[h] = getattr(self, h)
-            #log.debug('connecting event handler: %s' % str(h))
+            #log.debug('connecting event handler: %s', h)
         handlers['gtk_main_quit'] = gtk.main_quit
         tree.signal_autoconnect(handlers)
 
@@ -230,7 +250,7 @@ class BaseWindow(object):
         """
         for prefix in prefixes:
             for c in self.get_components(prefix):
-                #log.debug('cleaning component: %s' % c.name)
+                #log.debug('cleaning component: %s', c.name)
                 if isinstance(c, gtk.ComboBox):
                     c.set_active(-1)
                 elif isinstance(c, gtk.ToggleButton):
@@ -248,11 +268,7 @@ class BaseWindow(object):
         """
         Return the widget from WidgetTree
         """
-        for t in self.__w_trees:
-            widget = t.get_widget(widget_name)
-            if widget:
-                return widget
-        return None
+        return self.__w_index.get(widget_name)
 
 
     def get_components(self, prefix):
@@ -262,11 +278,8 @@ class BaseWindow(object):
         components = []
         if not isinstance(prefix, list):
             prefix = [prefix]
-        for t in self.__w_trees:
-            for p in prefix:
-                wlist = t.get_widget_prefix(p)
-                if wlist:
-                    components.extend(wlist)
+        for p in prefix:
+            components.extend(self.__w_index.get_prefix(p))
         return components
 
 
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+"""Field bindings between controller widgets and model fields.
+
+The reflection needed to move a value between a widget and a model field (the
+column type, the value converter, the column default and the model setter) is
+done once for each model class and cached. The controller hooks are looked up
+on the controller when used, so hooks assigned to the instance are honoured.
+"""
+
+import decimal
+
+from sqlalchemy.orm.properties import ColumnProperty
+from sqlalchemy.orm.attributes import InstrumentedAttribute
+from sqlalchemy import DateTime, Numeric
+
+from dawpag import utils as u
+
+log = u.get_logger('dawpag.binding')
+
+# FieldInfo by (model, field)
+_fields = {}
+
+
+def _to_decimal(value):
+    return decimal.Decimal(str(value))
+
+
+def _unchanged(value):
+    return value
+
+
+class FieldInfo(object):
+    """
+    Reflection of a field of a model, shared by every controller
+    """
+    def __init__(self, model, field):
+        self.field = field
+        self.column_type = str
+        self.default = None
+        attr = getattr(model, field)
+        if isinstance(attr, InstrumentedAttribute) and \
+            isinstance(attr.property, ColumnProperty):
+            col = attr.parententity.c[field]
+            self.column_type = col.type
+            # TODO: manage some callable values too
+            # For now just plain defaults
+            if col.default and not callable(col.default.arg):
+                self.default = col.default.arg
+        if isinstance(self.column_type, DateTime):
+            # TODO: Identify if Column contain only time, or timestamps
+            self.converter = u.str_to_date
+        elif isinstance(self.column_type, Numeric):
+            self.converter = _to_decimal
+        else:
+            self.converter = _unchanged
+        self.setter_name = None
+        if hasattr(model, 'set_%s' % field):
+            self.setter_name = 'set_%s' % field
+
+    def set_value(self, obj, value):
+        """
+        Set value to the field of obj, through the setter method of the model
+        if defined
+        """
+        if self.setter_name:
+            getattr(obj, self.setter_name)(value)
+        else:
+            setattr(obj, self.field, value)
+
+
+def get_field_info(model, field):
+    """
+    Return the FieldInfo of the field of model
+    """
+    key = (model, field)
+    info = _fields.get(key)
+    if info is None:
+        info = _fields[key] = FieldInfo(model, field)
+    return info
+
+
+class FieldBinding(object):
+    """
+    Binding of a widget of a controller to a field of a model. Holds the kind
+    of widget (a dawpag.enums.WidgetKind) and the callables used to move the
+    value between widget and model:
+
+        converter(value): convert the widget value to field type
+        formatter(value): format the field value as text for entries
+        validator(value): the controller _validate_[field] method or None
+        default(): the default value of field for new objects
+        setter(obj, value): set value to the field of obj
+
+    The _default_[field] and _validate_[field] hooks are taken from the
+    controller at each use, they may be assigned to the instance after the
+    binding is created.
+    """
+    def __init__(self, controller, model, field, widget, kind):
+        info = get_field_info(model, field)
+        self.field = field
+        self.widget = widget
+        self.kind = kind
+        self.converter = info.converter
+        self.setter = info.set_value
+        self.__controller = controller
+        self.__info = info
+        self.__default_name = '_default_%s' % field
+        self.__validator_name = '_validate_%s' % field
+        format = controller._format_widget_value
+        name = widget.name
+        self.formatter = lambda value: format(name, value)
+
+    def validator(self):
+        return getattr(self.__controller, self.__validator_name, None)
+    validator = property(validator)
+
+    def default(self):
+        """
+        Return the default value of field for new objects
+        """
+        default = getattr(self.__controller, self.__default_name, None)
+        if default is None:
+            return self.__info.default
+        return default()
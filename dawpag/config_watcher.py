@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+
+"""Reload the configuration of a running application when its files change.
+
+Changes to config.cfg and log.cfg are detected with inotify when pyinotify is
+installed, or by polling the modification time of the files otherwise. Both
+are driven by the GTK main loop (an io watch on the inotify descriptor or a
+timeout), no thread is left blocked waiting for changes.
+"""
+
+import os
+
+import gobject
+
+from dawpag import configuration
+from dawpag import utils as u
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+log = u.get_logger('dawpag.config_watcher')
+
+# Miliseconds between checks of the files when inotify is not available
+POLL_INTERVAL = 2000
+# Miliseconds to wait after the last change before reloading, editors often
+# write a file in several steps
+SETTLE_DELAY = 200
+
+# The watcher started by start()
+_watcher = None
+
+
+def _stat(file_name):
+    try:
+        st = os.stat(file_name)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size)
+
+
+if pyinotify is not None:
+    class _EventHandler(pyinotify.ProcessEvent):
+        def __init__(self, watcher):
+            pyinotify.ProcessEvent.__init__(self)
+            self.watcher = watcher
+
+        def process_default(self, event):
+            self.watcher.file_changed(event.pathname)
+
+
+class ConfigWatcher(object):
+    """
+    Watch the configuration file of config and the logging configuration
+    file. A changed configuration file is reloaded through
+    AppConfig.reload_config, which notifies its subscribers of the changed
+    keys, a changed logging file is applied with
+    dawpag.configuration.configure_logging. Files that fail to load are
+    logged and the configuration in use is kept
+    """
+    def __init__(self, config):
+        self.config = config
+        self.__files = {
+            os.path.abspath(config.CONFIG_FILE): self.__reload_config,
+            os.path.abspath(configuration.get_log_file()):
+                self.__reload_logging,
+            }
+        self.__stats = {}
+        for file_name in self.__files:
+            self.__stats[file_name] = _stat(file_name)
+        self.__source = None
+        self.__settle = None
+        self.__notifier = None
+
+    def __start_inotify(self):
+        manager = pyinotify.WatchManager()
+        notifier = pyinotify.Notifier(manager, _EventHandler(self), timeout=0)
+        # Watch the directories, editors often replace a file by renaming
+        mask = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO | \
+            pyinotify.IN_CREATE
+        for directory in set([os.path.dirname(f) for f in self.__files]):
+            manager.add_watch(directory, mask)
+        self.__notifier = notifier
+        self.__source = gobject.io_add_watch(manager.get_fd(), gobject.IO_IN,
+            self.__on_inotify)
+
+    def __on_inotify(self, fd, condition):
+        self.__notifier.read_events()
+        self.__notifier.process_events()
+        return True
+
+    def __on_poll(self):
+        self.check()
+        return True
+
+    def __on_settled(self):
+        self.__settle = None
+        self.check()
+        # Returning False removes the timeout source
+        return False
+
+    def __reload_config(self, file_name):
+        try:
+            changed = self.config.reload_config()
+        except configuration.ConfigError, e:
+            log.error('configuration not reloaded: %s' % str(e))
+            return
+        if changed:
+            log.info('configuration reloaded, changed: %s',
+                ', '.join(sorted(changed)))
+
+    def __reload_logging(self, file_name):
+        try:
+            configuration.configure_logging(file_name)
+        except Exception, e:
+            log.error('logging configuration not reloaded: %s' % str(e))
+            return
+        log.info('logging configuration reloaded')
+
+    # Public Methods
+
+    def start(self):
+        """
+        Start watching the files, with inotify if available
+        """
+        if self.__source is not None:
+            return
+        if pyinotify is not None:
+            try:
+                self.__start_inotify()
+                log.debug('watching configuration with inotify')
+                return
+            except Exception, e:
+                log.warning('inotify not available, polling configuration: '
+                    '%s' % str(e))
+        self.__source = gobject.timeout_add(POLL_INTERVAL, self.__on_poll)
+
+    def stop(self):
+        """
+        Stop watching the files
+        """
+        for source in (self.__source, self.__settle):
+            if source is not None:
+                gobject.source_remove(source)
+        self.__source = self.__settle = None
+        if self.__notifier is not None:
+            self.__notifier.stop()
+            self.__notifier = None
+
+    def file_changed(self, file_name):
+        """
+        Schedule a check of the files, if file_name is one of them. Repeated
+        calls within SETTLE_DELAY result in a single check
+        """
+        if os.path.abspath(file_name) not in self.__files:
+            return
+        if self.__settle is not None:
+            gobject.source_remove(self.__settle)
+        self.__settle = gobject.timeout_add(SETTLE_DELAY, self.__on_settled)
+
+    def check(self):
+        """
+        Reload the files modified since the last check. Removed files are
+        ignored, and the configuration loaded from them is kept
+        """
+        for file_name, reload in self.__files.items():
+            stat = _stat(file_name)
+            if stat == self.__stats[file_name]:
+                continue
+            self.__stats[file_name] = stat
+            if stat is not None:
+                reload(file_name)
+
+
+def start(config):
+    """
+    Start watching the configuration files of config, once per process.
+    Return the ConfigWatcher
+    """
+    global _watcher
+    if _watcher is None:
+        _watcher = ConfigWatcher(config)
+        _watcher.start()
+    return _watcher
+
+
+def stop():
+    """
+    Stop the watcher started by start()
+    """
+    global _watcher
+    if _watcher is not None:
+        _watcher.stop()
+        _watcher = None
@@ -19,15 +19,86 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
 # USA
 
-from configobj import ConfigObj
+from configobj import ConfigObj, ConfigObjError
 import logging, logging.config
+import decimal
 import os
+import re
 import dawpag
 
 
 class ConfigError(Exception):
     pass
 
+_int_re = re.compile(r'^[-+]?\d+$')
+_decimal_re = re.compile(r'^[-+]?(\d+\.?\d*|\.\d+)$')
+_booleans = {
+    'true': True, 'yes': True, 'on': True,
+    'false': False, 'no': False, 'off': False,
+    }
+_missing = object()
+
+
+class ConfigSnapshot(object):
+    """
+    The keys of global and environment sections flattened in a single dict,
+    global keys first, as AppConfig.get finds them. Values that can be read
+    as integers, decimals and booleans are coerced once, when the snapshot is
+    built. A snapshot is never changed, reloading the configuration builds a
+    new one
+    """
+    def __init__(self, conf, environment):
+        values = {}
+        values.update(conf[environment])
+        values.update(conf['global'])
+        self.__values = values
+        self.__ints = {}
+        self.__decimals = {}
+        self.__bools = {}
+        for key, value in values.items():
+            if not isinstance(value, basestring):
+                continue
+            text = value.strip()
+            if _int_re.match(text):
+                self.__ints[key] = int(text)
+            if _decimal_re.match(text):
+                self.__decimals[key] = decimal.Decimal(text)
+            if _booleans.has_key(text.lower()):
+                self.__bools[key] = _booleans[text.lower()]
+
+    def __typed(self, typed, key, default, type_name):
+        if key in typed:
+            return typed[key]
+        if key in self.__values:
+            raise ConfigError('%s is not %s: %s' % (key, type_name,
+                self.__values[key]))
+        return default
+
+    def keys(self):
+        return self.__values.keys()
+
+    def diff(self, other):
+        """
+        Return the set of keys added, removed or with a different value in
+        snapshot other
+        """
+        keys = set(self.__values.keys()) | set(other.keys())
+        return set([key for key in keys if
+            self.__values.get(key, _missing) != other.get(key, _missing)])
+
+    def get(self, key, default=None):
+        return self.__values.get(key, default)
+
+    def get_int(self, key, default=None):
+        return self.__typed(self.__ints, key, default, 'an integer')
+
+    def get_decimal(self, key, default=None):
+        return self.__typed(self.__decimals, key, default, 'a decimal')
+
+    def get_bool(self, key, default=None):
+        return self.__typed(self.__bools, key, default, 'a boolean')
+
+
 class AppConfig(object):
     """
     Application configuration module
@@ -36,6 +107,8 @@ class AppConfig(object):
         print "Loading configuration file : %s" % cfg_file
         self.conf = ConfigObj(cfg_file)
         self.CONFIG_FILE = cfg_file
+        self.snapshot = None
+        self.__subscribers = []
 
     def get(self, key, default=None, return_section=None):
         """
@@ -45,6 +118,8 @@ class AppConfig(object):
         in default sections global and environment.
         Example main.app_version to get value from conf['main']['app_version']
         """
+        if not return_section and self.snapshot is not None:
+            return self.snapshot.get(key, default)
         # if section is provided
         try:
             if return_section:
@@ -63,30 +138,116 @@ class AppConfig(object):
         except:
             raise ConfigError()
 
+    def get_int(self, key, default=None):
+        """
+        Return the value of a configuration key as an integer
+        """
+        return self.snapshot.get_int(key, default)
+
+    def get_decimal(self, key, default=None):
+        """
+        Return the value of a configuration key as a decimal.Decimal
+        """
+        return self.snapshot.get_decimal(key, default)
+
+    def get_bool(self, key, default=None):
+        """
+        Return the value of a configuration key as a boolean, from values
+        true/false, yes/no or on/off
+        """
+        return self.snapshot.get_bool(key, default)
+
+    def subscribe(self, callback):
+        """
+        Call callback(config, changed_keys) every time the configuration is
+        reloaded with changes
+        """
+        self.__subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.__subscribers:
+            self.__subscribers.remove(callback)
+
     def load_config(self):
         """
         Load the configuration file into config constants
         """
         print "Loading configuration......"
         try: # First of all, load the configured environment
-            self.ENVIRONMENT=self.conf['global']['main.environment']
+            environment=self.conf['global']['main.environment']
         except:
             raise ConfigError(_(u"Configuration invalid on environment "
                  "definition"))
+        if not self.conf.has_key(environment):
+            raise ConfigError(_(u"Configuration section not found for "
+                "environment %s") % environment)
+        self.ENVIRONMENT=environment
+        self.snapshot = ConfigSnapshot(self.conf, self.ENVIRONMENT)
         # load other default config variables
         self.LOG_LEVEL=self.get('log.level')
         self.DATABASE_LOG_LEVEL=self.get('database.log.level')
 
     def reload_config(self):
         """
-        Reload the configuration file and load the configuration variables again
+        Reload the configuration file and load the configuration variables
+        again. The file is read into a new ConfigObj, the current configuration
+        is kept if it can not be parsed or loaded. Return the set of changed
+        keys, subscribers are only called if it is not empty
         """
-        self.conf.reload()
-        self.load_config()
+        try:
+            conf = ConfigObj(self.CONFIG_FILE)
+        except ConfigObjError, e:
+            raise ConfigError(str(e))
+        previous_conf, previous = self.conf, self.snapshot
+        self.conf = conf
+        try:
+            self.load_config()
+        except ConfigError:
+            self.conf = previous_conf
+            raise
+        changed = previous.diff(self.snapshot)
+        if changed:
+            for callback in self.__subscribers[:]:
+                callback(self, changed)
+        return changed
 
 # Configuration object placeholder
 config=None
 
+# Names of the loggers created by dawpag.utils.get_logger
+logger_names = set()
+
+
+def configure_logging(file_name):
+    """
+    Configure logging from file_name
+    """
+    logging.config.fileConfig(file_name)
+    # fileConfig disables the loggers created before it, enable the
+    # application loggers again
+    for name in logger_names:
+        logging.getLogger(name).disabled = 0
+    configure_database_logging()
+
+def configure_database_logging():
+    """
+    Set the log level for sqlalchemy from database.log.level
+    """
+    logging.getLogger('sqlalchemy').setLevel(
+            eval('logging.'+config.get('database.log.level'))
+        )
+
+def get_log_file():
+    """
+    Return the name of the logging configuration file, log.cfg in the
+    directory of the configuration file
+    """
+    return os.sep.join([os.path.dirname(config.CONFIG_FILE),'log.cfg'])
+
+def _on_config_reloaded(conf, changed):
+    if 'database.log.level' in changed:
+        configure_database_logging()
+
 def set_config(cfg):
     """
     Defines the configuration object
@@ -94,10 +255,6 @@ def set_config(cfg):
     global config
     config=cfg
     config.load_config()
-    # Defines the log configuration
-    logging.config.fileConfig(os.sep.join(
-        [os.path.dirname(config.CONFIG_FILE),'log.cfg']))
-    # Set the log level for sqlalchemy orm
-    logging.getLogger('sqlalchemy').setLevel(
-            eval('logging.'+config.get('database.log.level'))
-        )
\ No newline at end of file
+    # Defines the log configuration, and the log level for sqlalchemy orm
+    configure_logging(get_log_file())
+    config.subscribe(_on_config_reloaded)
\ No newline at end of file
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+"""Pool of closed controller windows kept hidden for reuse.
+
+Controllers whose class sets pooled = True are hidden by do_close instead of
+destroyed, and handed to this pool. Opening the controller again reuses the
+hidden instance, refreshing its list with do_refresh instead of building the
+window and searching again. At most main.controller_pool_size windows are kept,
+the least recently closed is destroyed first.
+"""
+
+from dawpag import utils as u
+from dawpag.configuration import config as cfg
+
+log = u.get_logger('dawpag.controller_pool')
+
+# Hidden controllers, the most recently closed last
+_idle = []
+
+
+def acquire(cls):
+    """
+    Return a hidden controller of class cls refreshed and ready to be shown,
+    or a new instance if none is available
+    """
+    for ix in range(len(_idle) - 1, -1, -1):
+        if _idle[ix].__class__ is cls:
+            ctrl = _idle.pop(ix)
+            log.debug('reusing pooled %s', cls.__name__)
+            ctrl.do_refresh()
+            return ctrl
+    return cls()
+
+
+def release(ctrl):
+    """
+    Keep the hidden window of ctrl for reuse, destroying the least recently
+    closed windows over the pool size
+    """
+    if ctrl in _idle:
+        return
+    _idle.append(ctrl)
+    size = cfg.get_int('main.controller_pool_size', 4)
+    while len(_idle) > size:
+        _idle.pop(0).window.destroy()
+
+
+def clear():
+    """
+    Destroy all hidden windows
+    """
+    while _idle:
+        _idle.pop().window.destroy()
@@ -19,30 +19,530 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
 # USA
 
-from sqlalchemy import create_engine, MetaData
-from sqlalchemy.orm import sessionmaker
+import os
+import threading
+
+from sqlalchemy import create_engine, MetaData, pool
+from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.orm.interfaces import SessionExtension
+from sqlalchemy.orm.session import Session as _Session
+from sqlalchemy.interfaces import ConnectionProxy, PoolListener
 from dawpag import configuration as cfg
+from dawpag.exceptions import PendingWritesError
+from dawpag.sqlite_profiles import SQLITE_PROFILES
+from dawpag import utils as u
+
+log = u.get_logger('dawpag.database')
 
 _engine = None
+# Process that created _engine, a forked process creates its own
+_engine_pid = None
+# Engine of bulk sessions when it can not be _engine, see get_bulk_engine
+_bulk_engine = None
+# CheckoutCounter of _engine
+_engine_checkouts = None
+# (engine, CheckoutCounter) of the engines replaced on a configuration
+# reload, each is disposed once its connections are checked in
+_retired = []
+_subscribed = False
+_engine_lock = threading.Lock()
+
+# Configuration keys of the engine, a new engine is created when one of them
+# changes on a configuration reload
+ENGINE_KEYS = ('database.pool_class', 'database.pool_size',
+    'database.max_overflow', 'database.pool_recycle', 'database.pool_timeout',
+    'database.pool_pre_ping', 'database.statement_cache_size',
+    'database.sqlite.profile')
+# Pools that keep each SQLite connection in the thread that opened it, as
+# pysqlite requires
+SQLITE_THREAD_POOLS = ('SingletonThreadPool', 'NullPool')
+# Options only accepted by QueuePool
+QUEUE_POOL_OPTIONS = ('max_overflow', 'pool_timeout')
+# Prefix of the configuration keys of SQLite pragmas set on every connection,
+# as in database.sqlite.pragma.cache_size=-8000
+PRAGMA_PREFIX = 'database.sqlite.pragma.'
+
+
+class StatementCounter(ConnectionProxy):
+    """
+    Connection proxy that counts every SQL statement sent to database, each
+    thread has its own count
+    """
+    def __init__(self):
+        self.__local = threading.local()
+
+    def get_count(self):
+        """
+        Return the number of statements issued by the current thread
+        """
+        return getattr(self.__local, 'count', 0)
+
+    def cursor_execute(self, execute, cursor, statement, parameters, context,
+        executemany):
+        self.__local.count = self.get_count() + 1
+        return execute(cursor, statement, parameters, context)
+
+# Counter of statements issued by the application engine
+statement_counter = StatementCounter()
+
+
+def statement_count():
+    """
+    Return the number of SQL statements issued by the current thread since the
+    engine was created
+    """
+    return statement_counter.get_count()
+
+
+class CheckoutCounter(PoolListener):
+    """
+    Pool listener that counts the connections checked out of the pool
+    """
+    def __init__(self):
+        self.count = 0
+        self.__lock = threading.Lock()
+
+    def checkout(self, dbapi_con, con_record, con_proxy):
+        self.__lock.acquire()
+        try:
+            self.count += 1
+        finally:
+            self.__lock.release()
+
+    def checkin(self, dbapi_con, con_record):
+        self.__lock.acquire()
+        try:
+            self.count -= 1
+        finally:
+            self.__lock.release()
+
+
+class PrePing(PoolListener):
+    """
+    Pool listener that tests each connection when it is checked out of the
+    pool, so connections dropped by the server are replaced instead of
+    failing the first statement
+    """
+    def checkout(self, dbapi_con, con_record, con_proxy):
+        try:
+            cursor = dbapi_con.cursor()
+            try:
+                cursor.execute('SELECT 1')
+            finally:
+                cursor.close()
+        except Exception, e:
+            log.warning('discarding dead database connection: %s' % str(e))
+            # The pool invalidates the connection and checks out another one
+            raise DisconnectionError(str(e))
+
+
+class SQLitePragmas(PoolListener):
+    """
+    Pool listener that sets SQLite pragmas on every new connection.
+        pragmas: list of (name, value) tuples, set in that order
+    """
+    def __init__(self, pragmas):
+        self.pragmas = pragmas
+
+    def connect(self, dbapi_con, con_record):
+        cursor = dbapi_con.cursor()
+        try:
+            for name, value in self.pragmas:
+                cursor.execute('PRAGMA %s=%s' % (name, value))
+        finally:
+            cursor.close()
+
+
+def get_pragmas():
+    """
+    Return the SQLite pragmas of the profile named by database.sqlite.profile
+    (default, SQLite own settings, if not configured), followed by the ones configured with
+    PRAGMA_PREFIX keys sorted by name, as a list of (name, value) tuples.
+    A configured pragma replaces the value of the profile
+    """
+    config = cfg.config
+    profile = config.get('database.sqlite.profile', 'default')
+    if not SQLITE_PROFILES.has_key(profile):
+        raise cfg.ConfigError('unknown database.sqlite.profile: %s' % profile)
+    configured = {}
+    for key in config.snapshot.keys():
+        if key.startswith(PRAGMA_PREFIX):
+            configured[key[len(PRAGMA_PREFIX):]] = config.get(key)
+    pragmas = []
+    for name, value in SQLITE_PROFILES[profile]:
+        pragmas.append((name, configured.pop(name, value)))
+    extra = configured.items()
+    extra.sort()
+    return pragmas + extra
+
+
+def _is_memory(dburi):
+    """
+    Whether dburi names a SQLite database in memory
+    """
+    return ':memory:' in dburi or dburi.rstrip('/') == 'sqlite:'
+
+
+def get_engine_options(dburi):
+    """
+    Return the keyword arguments for create_engine from the database.*
+    configuration keys. Pool options not configured are left to the
+    sqlalchemy defaults of the database dialect
+    """
+    config = cfg.config
+    options = {'encoding': config.get('database.encoding'),
+        'proxy': statement_counter}
+    connect_args = {}
+    sqlite = dburi.startswith('sqlite')
+    pool_class = config.get('database.pool_class')
+    if pool_class and not hasattr(pool, pool_class):
+        raise cfg.ConfigError('unknown database.pool_class: %s' % pool_class)
+    if sqlite and pool_class and pool_class not in SQLITE_THREAD_POOLS:
+        if pool_class == 'QueuePool' and not _is_memory(dburi):
+            # pysqlite refuses connections used by another thread than the
+            # one that opened them, QueuePool hands each connection to a
+            # single thread at a time, but not always the same one
+            connect_args['check_same_thread'] = False
+        else:
+            log.warning('database.pool_class %s would share a SQLite '
+                'connection between threads, using the default pool' %
+                pool_class)
+            pool_class = None
+    if pool_class:
+        options['poolclass'] = getattr(pool, pool_class)
+        effective_pool = pool_class
+    elif sqlite:
+        effective_pool = 'SingletonThreadPool'
+    else:
+        effective_pool = 'QueuePool'
+    for key in ('pool_size', 'max_overflow', 'pool_recycle', 'pool_timeout'):
+        value = config.get_int('database.%s' % key)
+        if value is None:
+            continue
+        if key in QUEUE_POOL_OPTIONS and effective_pool != 'QueuePool':
+            log.warning('database.%s only applies to QueuePool, ignored' %
+                key)
+            continue
+        options[key] = value
+    listeners = []
+    if config.get_bool('database.pool_pre_ping', False):
+        listeners.append(PrePing())
+    if sqlite:
+        cache_size = config.get_int('database.statement_cache_size')
+        if cache_size is not None:
+            connect_args['cached_statements'] = cache_size
+        pragmas = get_pragmas()
+        if pragmas:
+            listeners.append(SQLitePragmas(pragmas))
+    if listeners:
+        options['listeners'] = listeners
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
 
 def get_engine():
-    global _engine
-    if not _engine:
-        _engine = create_engine(cfg.config.get('database.dburi'),\
-            encoding=cfg.config.get('database.encoding'))
-    return _engine
+    """
+    Return the application engine, created on the first call from the
+    database.* configuration keys. Safe to call from any thread
+    """
+    global _engine, _engine_pid, _bulk_engine, _engine_checkouts, _subscribed
+    engine = _engine
+    if engine and _engine_pid == os.getpid() and not _retired:
+        return engine
+    _engine_lock.acquire()
+    try:
+        if _engine and _engine_pid != os.getpid():
+            # Connections inherited from the parent process can not be
+            # shared nor closed here, just forget them
+            _engine = None
+            _bulk_engine = None
+            del _retired[:]
+        _dispose_retired()
+        if not _engine:
+            dburi = cfg.config.get('database.dburi')
+            options = get_engine_options(dburi)
+            _engine_checkouts = CheckoutCounter()
+            # Last, so a connection replaced by PrePing is counted once
+            options['listeners'] = options.get('listeners', []) + [
+                _engine_checkouts]
+            _engine = create_engine(dburi, **options)
+            if _engine.name == 'sqlite':
+                _engine.dialect.do_begin = _sqlite_begin
+            _engine_pid = os.getpid()
+            if not _subscribed:
+                cfg.config.subscribe(_on_config_reloaded)
+                _subscribed = True
+        return _engine
+    finally:
+        _engine_lock.release()
+
+
+def get_bulk_engine():
+    """
+    Return the engine of bulk sessions. SingletonThreadPool hands every
+    session of a thread the same SQLite connection, committing a bulk
+    session would commit the application session too, so bulk sessions use
+    connections of their own then. A database in memory only exists in its
+    one connection, which is shared
+    """
+    global _bulk_engine
+    engine = get_engine()
+    dburi = str(engine.url)
+    if not isinstance(engine.pool, pool.SingletonThreadPool) or \
+        _is_memory(dburi):
+        return engine
+    _engine_lock.acquire()
+    try:
+        if not _bulk_engine:
+            options = get_engine_options(dburi)
+            for key in ('pool_size', 'max_overflow', 'pool_recycle',
+                'pool_timeout'):
+                options.pop(key, None)
+            options['poolclass'] = pool.NullPool
+            _bulk_engine = create_engine(dburi, **options)
+            _bulk_engine.dialect.do_begin = _sqlite_begin
+        return _bulk_engine
+    finally:
+        _engine_lock.release()
+
+
+def _sqlite_begin(dbapi_con):
+    """
+    Begin a transaction on a SQLite connection. pysqlite begins transactions
+    itself before INSERT, UPDATE and DELETE, except on connections in
+    autocommit mode, as the ones of bulk sessions, where BEGIN is sent here
+    """
+    if dbapi_con.isolation_level is not None:
+        return
+    cursor = dbapi_con.cursor()
+    try:
+        cursor.execute('BEGIN')
+    finally:
+        cursor.close()
+
+
+def reset_engine():
+    """
+    Replace the current engine, a new one is created from configuration on
+    next use. The connections of the current engine are closed once they
+    are all checked in, sessions in a transaction keep using it until then
+    """
+    global _engine, _bulk_engine
+    _engine_lock.acquire()
+    try:
+        if _engine:
+            _retired.append((_engine, _engine_checkouts))
+            _engine = None
+        # NullPool, its connections are closed as they are checked in
+        _bulk_engine = None
+        _dispose_retired()
+    finally:
+        _engine_lock.release()
+
+
+def _dispose_retired():
+    """
+    Dispose the retired engines whose connections are all checked in, call
+    with _engine_lock held. SingletonThreadPool would close the connections
+    still in use
+    """
+    for retired in _retired[:]:
+        engine, checkouts = retired
+        if checkouts.count == 0:
+            engine.dispose()
+            _retired.remove(retired)
+
+
+def _on_config_reloaded(config, changed):
+    if 'database.dburi' in changed:
+        log.warning('database.dburi changed, restart the application to use '
+            'the new database')
+    if [key for key in changed if key in ENGINE_KEYS or
+        key.startswith(PRAGMA_PREFIX)]:
+        log.info('database engine configuration changed, reconnecting')
+        reset_engine()
+
+
+class WriteTracker(SessionExtension):
+    """
+    Session extension that keeps in has_writes of the session whether it
+    wrote to database in a transaction not committed nor rolled back yet
+    """
+    def after_flush(self, session, flush_context):
+        session.has_writes = True
+
+    def after_bulk_update(self, session, query, query_context, result):
+        session.has_writes = True
+
+    def after_bulk_delete(self, session, query, query_context, result):
+        session.has_writes = True
+
+    def after_commit(self, session):
+        # Writes of a savepoint are still to be committed with its parent
+        if not session.transaction.nested:
+            session.has_writes = False
+
+    def after_rollback(self, session):
+        if not session.transaction.nested:
+            session.has_writes = False
+
+
+class EngineTracker(SessionExtension):
+    """
+    Session extension that keeps in transaction_engine of the session the
+    engine its transaction began on. When the engine is replaced on a
+    configuration reload the transaction goes on with its connection
+    """
+    def after_begin(self, session, transaction, connection):
+        if session.transaction_engine is None:
+            session.transaction_engine = connection.engine
+
+    def after_commit(self, session):
+        if not session.transaction.nested:
+            session.transaction_engine = None
+
+    def after_rollback(self, session):
+        if not session.transaction.nested:
+            session.transaction_engine = None
+
+
+class LazyBindSession(_Session):
+    """
+    Session bound to the application engine on first use. Creating a session
+    does not create the engine, so importing the modules that hold a session
+    does not connect to the database
+    """
+    has_writes = False
+    transaction_engine = None
+
+    def get_bind(self, mapper, clause=None):
+        if self.bind is None:
+            return self.transaction_engine or get_engine()
+        return _Session.get_bind(self, mapper, clause)
+
+    def close(self):
+        _Session.close(self)
+        self.transaction_engine = None
+
 
 def create_session():
-        """Create a session that uses the engine from thread-local metadata."""
-        if not metadata.is_bound():
-            get_engine()
-        return sessionmaker()
+        """Create a session factory bound to the engine on first use"""
+        return sessionmaker(class_=LazyBindSession,
+            extension=[WriteTracker(), EngineTracker()])
 
 # Global Application Metadata
 metadata = MetaData()
 
 Session = create_session()
-Session.configure(bind=_engine)
 
-# The global session object
-session = Session()
\ No newline at end of file
+# Registry of one session per thread, the session of the main thread is the
+# application session used by windows
+ScopedSession = scoped_session(Session)
+
+# The global session object, a proxy to the session of the current thread
+session = ScopedSession
+
+
+def open_worker_session():
+    """
+    Return the session of the current thread, for work done outside the main
+    thread or in a forked process. In a forked process the sessions
+    inherited from the parent are forgotten and a new engine is used.
+    Close it with close_worker_session
+    """
+    if _engine_pid is not None and _engine_pid != os.getpid():
+        ScopedSession.registry.clear()
+    return ScopedSession()
+
+
+def close_worker_session():
+    """
+    Close the session of the current thread and remove it from registry,
+    objects still attached to it become detached
+    """
+    ScopedSession.remove()
+
+
+class WorkerSession(object):
+    """
+    Context manager for open_worker_session and close_worker_session. The
+    session is committed if the block completes, and rolled back otherwise:
+
+        with WorkerSession() as s:
+            ...
+    """
+    def __enter__(self):
+        self.session = open_worker_session()
+        return self.session
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.session.commit()
+            else:
+                self.session.rollback()
+        finally:
+            close_worker_session()
+        return False
+
+
+def open_bulk_session():
+    """
+    Return a new session on a connection of its own, for writes that roll
+    back to savepoints. Rolling back to a savepoint expires every object of
+    the session, the application session is left alone this way. The
+    session does not flush before queries, so changes are only written where
+    a savepoint protects them, nor expires objects on commit. Close it with
+    close_bulk_session.
+    Raise PendingWritesError if the session of current thread wrote changes
+    not committed yet: the bulk session could not write the rows they lock,
+    nor commit without them on a database in memory
+    """
+    if session().has_writes:
+        raise PendingWritesError('commit or roll back the session before '
+            'writing in bulk')
+    connection = get_bulk_engine().connect()
+    if connection.engine.name == 'sqlite':
+        # pysqlite commits the transaction before any statement that is not
+        # INSERT, UPDATE nor DELETE, SAVEPOINT included. In autocommit mode
+        # it leaves transactions to _sqlite_begin and the SQL sent
+        connection.connection.connection.isolation_level = None
+    return Session(bind=connection, autoflush=False, expire_on_commit=False)
+
+
+def close_bulk_session(bulk_session):
+    """
+    Close a session of open_bulk_session, rolling back what was not
+    committed, and return its connection to the pool
+    """
+    connection = bulk_session.bind
+    try:
+        bulk_session.close()
+    finally:
+        if connection.engine.name == 'sqlite':
+            # Back to the pysqlite default, the connection may be shared
+            # with the other sessions of this thread or pool
+            connection.connection.connection.isolation_level = ''
+        connection.close()
+
+
+def detach(objects, worker_session):
+    """
+    Remove objects from worker_session so they can be handed to another
+    thread. Only attributes already loaded are available on the detached
+    objects, load the ones needed by the receiver first
+    """
+    for obj in objects:
+        worker_session.expunge(obj)
+    return objects
+
+
+def merge_results(objects):
+    """
+    Merge objects detached from a worker session into the session of current
+    thread, the application session when called from main loop, without
+    loading them again from database. Return the merged objects
+    """
+    return [session.merge(obj, dont_load=True) for obj in objects]
\ No newline at end of file
@@ -21,6 +21,7 @@
 
 from sqlalchemy.orm import MapperExtension, EXT_CONTINUE
 from dawpag import utils as u
+from dawpag import lookup_cache
 
 log = u.get_logger('dawpag.database_ext')
 
@@ -31,18 +32,21 @@ class EventExtension(MapperExtension):
         Receive an object instance after that instance is DELETEed.
         """
         log.debug('AFTER DELETE')
+        lookup_cache.invalidate(instance.__class__)
 
     def after_insert(self, mapper, connection, instance):
         """
         Receive an object instance after that instance is INSERTed.
         """
         log.debug('AFTER INSERT')
+        lookup_cache.invalidate(instance.__class__)
 
     def after_update(self, mapper, connection, instance):
         """
         Receive an object instance after that instance is UPDATEed.
         """
         log.debug('AFTER UPDATE')
+        lookup_cache.invalidate(instance.__class__)
 
     def append_result(self, mapper, selectcontext, row, instance, result,
         **flags):
@@ -7,4 +7,7 @@ class DataState(enum):
     (INSERTING, BROWSING, EDITING) = range(3)
 
 class ColumnDraw(enum):
-    (TEXT, TOGGLE, PIXBUF, PROGRESS, CUSTOM) = (0,1,2,3,4)
\ No newline at end of file
+    (TEXT, TOGGLE, PIXBUF, PROGRESS, CUSTOM) = (0,1,2,3,4)
+
+class WidgetKind(enum):
+    (ENTRY, TOGGLE, COMBO, RELATION, COMPLETION, TEXTVIEW, RADIO_BOX) = range(7)
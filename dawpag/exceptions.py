@@ -26,4 +26,6 @@ class RangeError(Exception):
     pass
 
 class DuplicateAcceleratorError(Exception):
-    pass
\ No newline at end of file
+    pass
+class PendingWritesError(Exception):
+    pass
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+"""Cache of glade file definitions.
+
+Each glade file is read and validated once per process, and widget trees are
+built from the buffer kept in memory, instead of reading and parsing the file
+again every time a window is opened.
+"""
+
+from xml.dom import minidom
+from xml.parsers.expat import ExpatError
+import weakref
+
+import gtk.glade
+
+from dawpag import utils as u
+
+log = u.get_logger('dawpag.glade_cache')
+
+# GladeDefinition by file name
+_definitions = {}
+# GladeDefinition of each widget tree built from the cache
+_tree_definitions = weakref.WeakKeyDictionary()
+
+
+class GladeDefinition(object):
+    """
+    The contents of a glade file, checked to be a valid glade interface, and
+    the set of signal handler names it uses
+    """
+    def __init__(self, file_name):
+        self.file_name = file_name
+        f = open(file_name)
+        try:
+            self.buffer = f.read()
+        finally:
+            f.close()
+        try:
+            dom = minidom.parseString(self.buffer)
+        except ExpatError, e:
+            raise ValueError('invalid glade file %s: %s' % (file_name, str(e)))
+        root = dom.documentElement.tagName
+        self.handlers = set([s.getAttribute('handler') for s in
+            dom.getElementsByTagName('signal')])
+        dom.unlink()
+        if root != 'glade-interface':
+            raise ValueError('invalid glade file %s: root element is %s' %
+                (file_name, root))
+
+    def new_tree(self, root=None):
+        """
+        Build a new widget tree, of the whole file or only of the widget named
+        root and its children
+        """
+        tree = gtk.glade.xml_new_from_buffer(self.buffer, len(self.buffer),
+            root)
+        _tree_definitions[tree] = self
+        return tree
+
+
+def get_definition(file_name):
+    """
+    Return the GladeDefinition of file_name, reading it on the first call
+    """
+    definition = _definitions.get(file_name)
+    if definition is None:
+        log.debug('loading glade file %s', file_name)
+        definition = _definitions[file_name] = GladeDefinition(file_name)
+    return definition
+
+
+def new_tree(module_, root=None):
+    """
+    Build a widget tree from the glade file of given module, see
+    dawpag.utils.get_glade_file
+    """
+    return get_definition(u.get_glade_file(module_)).new_tree(root)
+
+
+def get_handlers(tree):
+    """
+    Return the set of signal handler names used by the glade file of tree, or
+    None if tree was not built from the cache
+    """
+    definition = _tree_definitions.get(tree)
+    if definition is None:
+        return None
+    return definition.handlers
+
+
+def clear():
+    """
+    Discard all cached definitions, next trees will read the files again
+    """
+    _definitions.clear()
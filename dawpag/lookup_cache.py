@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+"""Process wide cache of the option lists shown by relation combos.
+
+Options are kept as (id, label) tuples by model class and display field, and
+shared by every window. For big lookup tables, search returns only the options
+starting with a text, and keeps the most recent searches. The cache of a model
+is invalidated after its objects are committed by Model.save, Model.delete,
+Model.bulk_save, Model.bulk_update or the save and delete of windows, and
+when mapped with dawpag.database_ext.EventExtension, after any insert, update
+or delete of its objects. Call invalidate after writing a model otherwise.
+"""
+
+import threading
+
+from sqlalchemy.orm import class_mapper
+from sqlalchemy.orm.properties import ColumnProperty
+
+from dawpag import utils as u
+from dawpag.database import session
+
+log = u.get_logger('dawpag.lookup_cache')
+
+# Number of recent searches kept
+SEARCH_CACHE_SIZE = 200
+
+# Option lists by (model, field)
+_options = {}
+# Search results by (model, field, text, limit), and their usage order
+_searches = {}
+_search_order = []
+_lock = threading.Lock()
+
+
+def get_options(model, field):
+    """
+    Return the list of (id, label) tuples of all objects of model, labeled by
+    field, loading it if not cached
+    """
+    key = (model, field)
+    _lock.acquire()
+    try:
+        options = _options.get(key)
+    finally:
+        _lock.release()
+    if options is not None:
+        return options
+    log.debug('loading lookup options of %s.%s', model.__name__, field)
+    prop = class_mapper(model).get_property(field, raiseerr=False)
+    if isinstance(prop, ColumnProperty):
+        # Only the two columns are selected, no objects are loaded
+        options = [tuple(row) for row in session.query(model.id,
+            getattr(model, field)).order_by(model.id)]
+    else:
+        options = [(obj.id, getattr(obj, field)) for obj in
+            session.query(model).order_by(model.id)]
+    _lock.acquire()
+    try:
+        _options[key] = options
+    finally:
+        _lock.release()
+    return options
+
+
+def search(model, field, text, limit):
+    """
+    Return a list with up to limit (id, label) tuples of the objects of model
+    whose field starts with text, ordered by field
+    """
+    key = (model, field, text, limit)
+    _lock.acquire()
+    try:
+        options = _searches.get(key)
+        if options is not None:
+            _search_order.remove(key)
+            _search_order.append(key)
+            return options
+    finally:
+        _lock.release()
+    column = getattr(model, field)
+    pattern = u.escape_like(text) + '%'
+    options = [tuple(row) for row in session.query(model.id, column).filter(
+        column.like(pattern, escape=u.LIKE_ESCAPE)).order_by(column).limit(
+        limit)]
+    _lock.acquire()
+    try:
+        if key not in _searches:
+            _search_order.append(key)
+        _searches[key] = options
+        while len(_search_order) > SEARCH_CACHE_SIZE:
+            del _searches[_search_order.pop(0)]
+    finally:
+        _lock.release()
+    return options
+
+
+def invalidate(model):
+    """
+    Discard the cached options and searches of model, and of the models it
+    inherits from
+    """
+    _lock.acquire()
+    try:
+        for key in _options.keys():
+            if issubclass(model, key[0]):
+                del _options[key]
+        for key in _searches.keys():
+            if issubclass(model, key[0]):
+                del _searches[key]
+                _search_order.remove(key)
+    finally:
+        _lock.release()
+
+
+def clear():
+    """
+    Discard all cached options
+    """
+    _lock.acquire()
+    try:
+        _options.clear()
+        _searches.clear()
+        del _search_order[:]
+    finally:
+        _lock.release()
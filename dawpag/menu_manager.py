@@ -21,6 +21,7 @@
 
 import gtk
 from dawpag.base_controller import BaseController
+from dawpag import controller_pool
 
 class TreeMainMenu(object):
     def __init__(self, tree_view):
@@ -56,11 +57,15 @@ class TreeMainMenu(object):
     def row_activated(self, treeview, path, column, data=None):
         """
         Test if Clicked item is a subclass of BaseController class, if yes
-        instanciate the controller and show it
+        instanciate the controller and show it. Pooled controllers reuse a
+        closed window when available
         """
         model = treeview.get_model()
         iter = model.get_iter(path)
         controller = model.get_value(iter, 2)
         if controller and issubclass(controller, BaseController):
-            c = controller()
+            if controller.pooled:
+                c = controller_pool.acquire(controller)
+            else:
+                c = controller()
             c.show()
\ No newline at end of file
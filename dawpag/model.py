@@ -19,12 +19,178 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
 # USA
 
-from dawpag.database import session
+from sqlalchemy import bindparam
+from sqlalchemy.orm import class_mapper, object_mapper, object_session
+from sqlalchemy.orm.attributes import instance_state, get_history
+from sqlalchemy.orm.properties import ColumnProperty, RelationProperty
+from dawpag.database import session, open_bulk_session, close_bulk_session
 from dawpag.configuration import config as conf
+from dawpag import lookup_cache
 from dawpag import utils as u
 
 log = u.get_logger('assessor.model')
 
+# Objects or mappings written at a time by bulk_save and bulk_update
+BULK_BATCH_SIZE = 500
+
+
+class BulkResult(object):
+    """
+    Outcome of Model.bulk_save and Model.bulk_update
+        count: number of rows written
+        failures: list of (object or mapping, exception) of the rows that
+            failed, in the order given
+    """
+    def __init__(self):
+        self.count = 0
+        self.failures = []
+
+    def __repr__(self):
+        return '<BulkResult count=%d failures=%d>' % (self.count,
+            len(self.failures))
+
+
+def _run_hook(objects, hook, result):
+    """
+    Call method hook of each object, return the objects whose hook did not
+    fail, failures are added to result
+    """
+    passed = []
+    for obj in objects:
+        try:
+            getattr(obj, hook)()
+        except Exception, e:
+            result.failures.append((obj, e))
+            continue
+        passed.append(obj)
+    return passed
+
+
+def _write_batch(bulk_session, items, write, result):
+    """
+    Call write(items) in a savepoint of bulk_session. if it fails, write the
+    items one at a time, each in its own savepoint, so only the failing items
+    are left out. Return the items written, failures are added to result
+    """
+    savepoint = bulk_session.begin_nested()
+    try:
+        write(items)
+        savepoint.commit()
+        result.count += len(items)
+        return items
+    except Exception, e:
+        savepoint.rollback()
+        if len(items) == 1:
+            result.failures.append((items[0], e))
+            return []
+    written = []
+    for item in items:
+        savepoint = bulk_session.begin_nested()
+        try:
+            write([item])
+            savepoint.commit()
+        except Exception, e:
+            savepoint.rollback()
+            result.failures.append((item, e))
+            continue
+        written.append(item)
+    result.count += len(written)
+    return written
+
+
+def _take_object(obj, bulk_session):
+    """
+    Move obj, and the objects it cascades saves to, from the session of
+    current thread to bulk_session. Return the objects moved
+    """
+    owner = session()
+    related = [obj] + [child for child, mapper in
+        object_mapper(obj).cascade_iterator('save-update',
+        instance_state(obj))]
+    taken = []
+    for child in related:
+        if object_session(child) is owner:
+            owner.expunge(child)
+            taken.append(child)
+    bulk_session.add(obj)
+    return taken
+
+
+def _unflushed(obj):
+    """
+    Return the (attribute, value) pairs set on persistent obj and not flushed
+    yet. Rolling back to a savepoint expires them, so they are set again
+    before writing obj once more. Changes to collections are not kept
+    """
+    if instance_state(obj).key is None:
+        return []
+    changes = []
+    for prop in object_mapper(obj).iterate_properties:
+        if not (isinstance(prop, ColumnProperty) or
+            (isinstance(prop, RelationProperty) and not prop.uselist)):
+            continue
+        added = get_history(obj, prop.key, passive=True).added
+        if added:
+            changes.append((prop.key, added[0]))
+    return changes
+
+
+def _return_objects(objects):
+    """
+    Add the objects left without session by a bulk session to the session of
+    current thread, unless it holds other objects for the same rows
+    """
+    owner = session()
+    for obj in objects:
+        key = instance_state(obj).key
+        if object_session(obj) is None and (key is None or
+            key not in owner.identity_map):
+            owner.add(obj)
+
+
+def _save_objects(bulk_session, objects, batch_size, result, taken):
+    """
+    Save objects in bulk_session as described in Model.bulk_save, without
+    committing. Return the objects written
+    """
+    # Unflushed changes of the objects of current batch, and of the objects
+    # they referenced in the session of current thread, by object id
+    changes = {}
+
+    def write(batch):
+        for obj in batch:
+            moved = _take_object(obj, bulk_session)
+            taken.extend(moved)
+            changes[id(obj)].extend([(child, _unflushed(child))
+                for child in moved])
+            for target, values in changes[id(obj)]:
+                for key, value in values:
+                    setattr(target, key, value)
+        bulk_session.flush()
+
+    saved = []
+    for start in range(0, len(objects), batch_size):
+        batch = _run_hook(objects[start:start + batch_size], 'before_save',
+            result)
+        changes.clear()
+        for obj in batch:
+            changes[id(obj)] = [(obj, _unflushed(obj))]
+        written = _write_batch(bulk_session, batch, write, result)
+        _run_hook(written, 'after_save', result)
+        saved.extend(written)
+    return saved
+
+
+def _expire_rows(keys):
+    """
+    Expire the objects with given identity keys loaded in the session of
+    current thread
+    """
+    for key in keys:
+        obj = session.identity_map.get(key)
+        if obj is not None:
+            session.expire(obj)
+
 
 class Model(object):
     """
@@ -80,6 +246,7 @@ class Model(object):
             self.before_save()
             session.add(self)
             session.commit()
+            lookup_cache.invalidate(self.__class__)
             self.after_save()
         except:
             session.rollback()
@@ -94,10 +261,171 @@ class Model(object):
         try:
             session.delete(self)
             session.commit()
+            lookup_cache.invalidate(self.__class__)
         except:
             session.rollback()
     # Classmethods
 
+    def bulk_save(cls, objects, batch_size=BULK_BATCH_SIZE):
+        """
+        Save objects in a single transaction, instead of one transaction per
+        object as save does. Objects are flushed batch_size at a time:
+        before_save is called for every object of a batch, then the batch is
+        flushed, then after_save is called for the objects written.
+        A batch that fails is written again one object at a time, so a failing
+        object does not undo the others. Return a BulkResult with the objects
+        whose hook or write failed, a failure in after_save does not undo the
+        object written.
+        The objects are written by a session of their own, pending changes of
+        session are not flushed with them. Objects of session, and the ones
+        they reference, are moved to it meanwhile; objects of other sessions
+        fail. The objects written, and the ones moved, are in session when it
+        returns. Any other exception rolls back every batch and is raised.
+        Raise PendingWritesError if session holds changes flushed and not
+        committed yet
+        """
+        result = BulkResult()
+        objects = list(objects)
+        taken = []
+        saved = []
+        bulk_session = open_bulk_session()
+        try:
+            written = _save_objects(bulk_session, objects, batch_size, result,
+                taken)
+            bulk_session.commit()
+            saved = written
+        finally:
+            close_bulk_session(bulk_session)
+            _return_objects(taken + saved)
+        for model in set([obj.__class__ for obj in saved]):
+            lookup_cache.invalidate(model)
+        if result.failures:
+            log.warning('bulk save of %s: %d saved, %d failed' % (
+                cls.__name__, result.count, len(result.failures)))
+        return result
+    bulk_save = classmethod(bulk_save)
+
+    def bulk_update(cls, mappings, batch_size=BULK_BATCH_SIZE):
+        """
+        Update rows from a list of dicts of field values, each with the
+        primary key as id, in a single transaction. Rows are written with
+        executemany, one UPDATE for each batch of mappings setting the same
+        fields, without loading objects, so before_save and after_save are
+        not called. Objects of cls already loaded in session are expired.
+        Models mapped with inheritance are updated through their objects, and
+        the hooks are called. Return a BulkResult with the mappings that
+        failed, a failing mapping does not undo the others. Mappings whose id
+        matches no row are not reported. Any other exception rolls back every
+        batch and is raised. Raise PendingWritesError if session holds changes
+        flushed and not committed yet
+        """
+        mapper = class_mapper(cls)
+        if mapper.inherits is not None or len(mapper.primary_key) != 1:
+            return cls.__bulk_update_objects(mappings, batch_size)
+        table = mapper.local_table
+        pk = mapper.primary_key[0]
+        statement = table.update(pk == bindparam('_id'))
+        result = BulkResult()
+        # Mappings grouped by the columns they set, so every group runs as a
+        # single executemany, and their statement parameters by mapping id
+        groups = {}
+        parameters = {}
+        for mapping in mappings:
+            params = {}
+            try:
+                for field, value in mapping.items():
+                    if field == 'id':
+                        params['_id'] = value
+                        continue
+                    prop = mapper.get_property(field)
+                    if not isinstance(prop, ColumnProperty):
+                        raise ValueError('%s is not a column of %s' % (field,
+                            cls.__name__))
+                    params[prop.columns[0].key] = value
+                if not params.has_key('_id'):
+                    raise ValueError('mapping without id')
+            except Exception, e:
+                result.failures.append((mapping, e))
+                continue
+            columns = params.keys()
+            columns.sort()
+            groups.setdefault(tuple(columns), []).append(mapping)
+            parameters[id(mapping)] = params
+
+        bulk_session = open_bulk_session()
+
+        def write(items):
+            bulk_session.connection().execute(statement,
+                [parameters[id(mapping)] for mapping in items])
+
+        keys = []
+        try:
+            for items in groups.values():
+                for start in range(0, len(items), batch_size):
+                    written = _write_batch(bulk_session,
+                        items[start:start + batch_size], write, result)
+                    keys.extend([mapper.identity_key_from_primary_key(
+                        [parameters[id(mapping)]['_id']])
+                        for mapping in written])
+            bulk_session.commit()
+        finally:
+            close_bulk_session(bulk_session)
+        _expire_rows(keys)
+        lookup_cache.invalidate(cls)
+        if result.failures:
+            log.warning('bulk update of %s: %d updated, %d failed' % (
+                cls.__name__, result.count, len(result.failures)))
+        return result
+    bulk_update = classmethod(bulk_update)
+
+    def __bulk_update_objects(cls, mappings, batch_size):
+        """
+        bulk_update through the objects of the mappings, for models whose
+        rows span more than one table
+        """
+        mappings = list(mappings)
+        result = BulkResult()
+        keys = []
+        # Objects of the mappings written, by mapping id
+        objects = {}
+        bulk_session = open_bulk_session()
+
+        def write(batch):
+            # Values are set in the savepoint of the batch, beginning a
+            # savepoint flushes the session
+            for mapping in batch:
+                values = dict(mapping)
+                obj = bulk_session.query(cls).get(values.pop('id'))
+                if obj is None:
+                    raise ValueError('%s not found: %s' % (cls.__name__,
+                        mapping['id']))
+                obj.set_values(**values)
+                obj.before_save()
+                objects[id(mapping)] = obj
+            bulk_session.flush()
+
+        try:
+            for start in range(0, len(mappings), batch_size):
+                written = _write_batch(bulk_session,
+                    mappings[start:start + batch_size], write, result)
+                for mapping in written:
+                    obj = objects.pop(id(mapping))
+                    keys.append(instance_state(obj).key)
+                    try:
+                        obj.after_save()
+                    except Exception, e:
+                        result.failures.append((mapping, e))
+            bulk_session.commit()
+        finally:
+            close_bulk_session(bulk_session)
+        _expire_rows(keys)
+        lookup_cache.invalidate(cls)
+        if result.failures:
+            log.warning('bulk update of %s: %d updated, %d failed' % (
+                cls.__name__, result.count, len(result.failures)))
+        return result
+    __bulk_update_objects = classmethod(__bulk_update_objects)
+
     def first(cls):
         return session.query(cls).first()
     first = classmethod(first)
@@ -114,6 +442,35 @@ class Model(object):
         return session.query(cls).filter(*args, **kwargs)
     filter_by = classmethod(filter_by)
 
+    def page_after(cls, last_key, size, *filters):
+        """
+        Return a list with up to size objects, ordered by id, with id greater
+        than last_key. pass None as last_key to get the first page.
+        Pages are sought through the primary key index instead of an OFFSET,
+        so a deep page costs the same as the first one
+        """
+        query = session.query(cls)
+        for f in filters:
+            query = query.filter(f)
+        if last_key is not None:
+            query = query.filter(cls.id > last_key)
+        return query.order_by(cls.id).limit(size).all()
+    page_after = classmethod(page_after)
+
+    def page_before(cls, first_key, size, *filters):
+        """
+        Return a list with up to size objects, ordered by id, with id lower
+        than first_key. Used to go back from a page got with page_after
+        """
+        query = session.query(cls)
+        for f in filters:
+            query = query.filter(f)
+        query = query.filter(cls.id < first_key)
+        objects = query.order_by(cls.id.desc()).limit(size).all()
+        objects.reverse()
+        return objects
+    page_before = classmethod(page_before)
+
     # def get_by(cls, *args, **kwargs):
     #     return session.query(cls).filter(*args, **kwargs).first()
     # get_by = classmethod(get_by)
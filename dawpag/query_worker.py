@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+import threading
+import gobject
+
+from dawpag import utils as u
+from dawpag.database import open_worker_session, close_worker_session, \
+    detach, statement_count
+
+log = u.get_logger('dawpag.query_worker')
+
+# Worker threads need the GIL released while the main loop is idle
+gobject.threads_init()
+
+
+class QueryWorker(threading.Thread):
+    """
+    Run a query outside the GTK main loop.
+    The query is built and iterated on a session owned by the worker thread,
+    loaded objects are detached from that session and delivered back to the
+    main loop in chunks through gobject.idle_add, where they can be merged
+    into the application session with dawpag.database.merge_results.
+
+        build_query: callable receiving the worker session and returning the
+            query to be executed
+        on_chunk: called on main loop with (worker, list_of_objects)
+        on_finish: called on main loop with (worker, error), error is None if
+            the query was completed
+
+    The number of SQL statements issued by the worker is available in
+    statement_count when on_finish is called
+    """
+    def __init__(self, build_query, on_chunk, on_finish, chunk_size=100):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.__build_query = build_query
+        self.__on_chunk = on_chunk
+        self.__on_finish = on_finish
+        self.__chunk_size = chunk_size
+        self.__cancel_event = threading.Event()
+        self.statement_count = 0
+
+    def __deliver(self, session, chunk):
+        """
+        Detach the objects from worker session and schedule the delivery on
+        main loop
+        """
+        detach(chunk, session)
+        gobject.idle_add(self.__dispatch_chunk, chunk)
+
+    def __dispatch_chunk(self, chunk):
+        if not self.is_cancelled():
+            self.__on_chunk(self, chunk)
+        # Returning False removes the idle source
+        return False
+
+    def __dispatch_finish(self, error):
+        if not self.is_cancelled():
+            self.__on_finish(self, error)
+        return False
+
+    def cancel(self):
+        """
+        Ask the worker to stop. chunks not yet delivered are discarded
+        """
+        self.__cancel_event.set()
+
+    def is_cancelled(self):
+        return self.__cancel_event.isSet()
+
+    def run(self):
+        session = open_worker_session()
+        start_count = statement_count()
+        error = None
+        try:
+            try:
+                chunk = []
+                for obj in self.__build_query(session):
+                    if self.is_cancelled():
+                        log.debug('query worker cancelled')
+                        return
+                    chunk.append(obj)
+                    if len(chunk) >= self.__chunk_size:
+                        self.__deliver(session, chunk)
+                        chunk = []
+                if chunk:
+                    self.__deliver(session, chunk)
+            except Exception, e:
+                log.error('query worker failed: %s' % str(e))
+                error = e
+        finally:
+            self.statement_count = statement_count() - start_count
+            close_worker_session()
+        gobject.idle_add(self.__dispatch_finish, error)
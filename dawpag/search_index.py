@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+
+"""Search indexes for like('%text%') searches.
+
+A leading wildcard LIKE can not use a B-tree index, so searches on big tables
+scan the whole table. A search index keeps a shadow table that can answer the
+same question through an index. The shadow table is kept in sync by the
+database itself (triggers on the indexed table), so rows written by other
+processes, terminals or plain SQL are indexed too.
+
+Backends are chosen by database dialect, see register_backend. An index is
+set up on a background thread the first time it is asked for. Until it is
+ready, when no backend is available for the database, or when the index can
+not answer a given text, the search falls back to LIKE.
+"""
+
+import threading
+
+from sqlalchemy.orm import class_mapper
+from sqlalchemy.orm.properties import ColumnProperty
+from sqlalchemy.sql import table, column, select
+
+from dawpag import utils as u
+from dawpag.database import get_engine
+
+log = u.get_logger('dawpag.search_index')
+
+
+class SearchIndex(object):
+    """
+    Base class for search index backends. An index serves a single field of a
+    model, and must be kept in sync by the database once set up
+    """
+    def __init__(self, model, field):
+        self.model = model
+        self.field = field
+        mapper = class_mapper(model)
+        self.table_name = mapper.local_table.name
+        self.key_name = mapper.primary_key[0].name
+
+    def setup(self, connection):
+        """
+        Create the index structures if needed, and fill them with the rows
+        already in the table. Return False if the index can not be used on
+        this database
+        """
+        raise NotImplementedError
+
+    def filter(self, text):
+        """
+        Return a criterion selecting the objects whose field contains text,
+        or None if the index can not answer it and LIKE must be used
+        """
+        raise NotImplementedError
+
+
+class SQLiteTrigramIndex(SearchIndex):
+    """
+    Index backed by an external content SQLite FTS5 table with the trigram
+    tokenizer (SQLite 3.34 or newer), kept in sync by insert, update and
+    delete triggers on the indexed table. FTS5 trigram tables answer
+    LIKE '%text%' through the index for texts of three or more characters,
+    with the same case rules of LIKE
+    """
+    min_length = 3
+
+    def __init__(self, model, field):
+        super(SQLiteTrigramIndex, self).__init__(model, field)
+        self.index_name = '%s_%s_fts' % (self.table_name, field)
+        self.__index = table(self.index_name, column('rowid'), column(field))
+
+    def __triggers(self):
+        """
+        Return the (name, sql) of the triggers that keep the index in sync
+        """
+        values = {'index': self.index_name, 'table': self.table_name,
+            'key': self.key_name, 'field': self.field}
+        insert = ("INSERT INTO %(index)s (rowid, %(field)s) "
+            "VALUES (new.%(key)s, new.%(field)s);" % values)
+        delete = ("INSERT INTO %(index)s (%(index)s, rowid, %(field)s) "
+            "VALUES ('delete', old.%(key)s, old.%(field)s);" % values)
+        triggers = []
+        for suffix, event, body in (('ai', 'INSERT', insert),
+            ('ad', 'DELETE', delete), ('au', 'UPDATE', delete + ' ' + insert)):
+            name = '%s_%s' % (self.index_name, suffix)
+            triggers.append((name, "CREATE TRIGGER %s AFTER %s ON %s BEGIN "
+                "%s END" % (name, event, self.table_name, body)))
+        return triggers
+
+    def setup(self, connection):
+        triggers = self.__triggers()
+        existing = set([row[0] for row in connection.execute("SELECT name "
+            "FROM sqlite_master WHERE name LIKE ?", self.index_name + '%')])
+        if self.index_name in existing and \
+            len([n for n, sql in triggers if n in existing]) == len(triggers):
+            return True
+        trans = connection.begin()
+        try:
+            # Indexes left without their triggers may have missed writes
+            for name, sql in triggers:
+                connection.execute("DROP TRIGGER IF EXISTS %s" % name)
+            connection.execute("DROP TABLE IF EXISTS %s" % self.index_name)
+            connection.execute("CREATE VIRTUAL TABLE %s USING fts5(%s, "
+                "content='%s', content_rowid='%s', tokenize='trigram')" % (
+                self.index_name, self.field, self.table_name, self.key_name))
+            for name, sql in triggers:
+                connection.execute(sql)
+            connection.execute("INSERT INTO %s (%s) VALUES ('rebuild')" % (
+                self.index_name, self.index_name))
+            trans.commit()
+        except:
+            trans.rollback()
+            raise
+        log.info('created search index %s', self.index_name)
+        return True
+
+    def filter(self, text):
+        if len(text) < self.min_length:
+            return None
+        if u.escape_like(text) != text:
+            # FTS5 does not use the index for LIKE with an ESCAPE clause,
+            # LIKE on the table is as fast
+            return None
+        return getattr(self.model, self.key_name).in_(
+            select([self.__index.c.rowid],
+            self.__index.c[self.field].like('%' + text + '%')))
+
+
+# Backend classes by database dialect name
+_backends = {
+    'sqlite': SQLiteTrigramIndex,
+}
+
+# Indexes by (model, field). None means no index is available
+_indexes = {}
+# Keys of the indexes being set up
+_pending = set()
+_lock = threading.Lock()
+
+
+def register_backend(dialect, index_class):
+    """
+    Define the SearchIndex subclass used for databases of given dialect name
+    """
+    _backends[dialect] = index_class
+
+
+def get_index(model, field):
+    """
+    Return the search index for the field of model, or None if the field can
+    not be indexed on current database or its index is not ready yet. The
+    first call starts setting up the index on a background thread
+    """
+    key = (model, field)
+    _lock.acquire()
+    try:
+        if key in _indexes:
+            return _indexes[key]
+        if key in _pending:
+            return None
+        _pending.add(key)
+    finally:
+        _lock.release()
+    backend = _backends.get(get_engine().name)
+    if backend is None or not _is_column(model, field):
+        _set_index(key, None)
+        return None
+    thread = threading.Thread(target=_setup_index,
+        args=(key, backend(model, field)))
+    thread.setDaemon(True)
+    thread.start()
+    return None
+
+
+def _set_index(key, index):
+    _lock.acquire()
+    try:
+        _indexes[key] = index
+        _pending.discard(key)
+    finally:
+        _lock.release()
+
+
+def _setup_index(key, index):
+    """
+    Set up index on its own connection, runs on a background thread
+    """
+    model, field = key
+    connection = get_engine().connect()
+    try:
+        try:
+            if not index.setup(connection):
+                index = None
+        except Exception, e:
+            log.warning('search index for %s.%s not available, using '
+                'LIKE: %s' % (model.__name__, field, str(e)))
+            index = None
+    finally:
+        connection.close()
+    _set_index(key, index)
+
+
+def _is_column(model, field):
+    """
+    Only plain columns can be indexed
+    """
+    prop = class_mapper(model).get_property(field, raiseerr=False)
+    return isinstance(prop, ColumnProperty)
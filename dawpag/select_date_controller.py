@@ -21,11 +21,16 @@
 
 import utils as u
 from dawpag.base_window import BaseWindow
+from dawpag import window_pool
 import datetime
 
 #log = u.get_logger('dawpag.date_selection')
 
 class SelectDateWindow(BaseWindow):
+    """
+    Date selection dialog. Instances are kept by dawpag.window_pool, closing
+    the dialog hides it for reuse
+    """
     __entry = None
 
     def _initialize(self):
@@ -53,7 +58,7 @@ class SelectDateWindow(BaseWindow):
             self.__entry.set_text(u.date_to_str(date))
             if self.__callback:
                 self.__callback()
-            self.window.destroy()
+            window_pool.release(self)
         except:
             self.message_error(_(u'Selecione a data corretamente'))
 
@@ -61,7 +66,7 @@ class SelectDateWindow(BaseWindow):
         """
         Check user information and accept or reject the login
         """
-        self.window.destroy()
+        window_pool.release(self)
 
     def on_bt_today_clicked(self, data=None):
         """
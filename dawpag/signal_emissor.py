@@ -92,11 +92,12 @@ class SignalEmissor(object):
         for signal in self.__signals__dict__:
             slist = self.__signals__dict__[signal]
             for ix, val in enumerate(slist):
-                log.debug(str(val))
                 if val[0] == handler_id:
+                    if __debug__:
+                        log.debug('disconnected handler %s', val)
                     slist.pop(ix)
                     return True
-        log.warning('handler "%d" does not exist' % handler_id)
+        log.warning('handler "%d" does not exist', handler_id)
         return False
 
     def signal_disconnect_all(self, signal):
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+
+"""Pragma profiles for SQLite connections, chosen by database.sqlite.profile.
+
+Kept apart from dawpag.database, with no dependencies, so the benchmark in
+benchmarks/sqlite_profile.py measures the same pragmas the application sets.
+"""
+
+# Pragmas of each profile, as (name, value) tuples set in order.
+# performance uses write-ahead logging, so readers do not wait for writers,
+# and syncs to disk only at checkpoints instead of on every commit. WAL is
+# stored in the database file, adds -wal and -shm files next to it and does
+# not work on network filesystems, and synchronous=NORMAL may lose the last
+# commits on power loss, so it must be chosen explicitly
+SQLITE_PROFILES = {
+    'default': (),
+    'performance': (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        # 16MB of page cache per connection, negative values are in KB
+        ('cache_size', '-16000'),
+        ('mmap_size', '268435456'),
+        ('temp_store', 'MEMORY'),
+        ),
+    }
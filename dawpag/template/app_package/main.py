@@ -25,6 +25,7 @@ import gtk
 from controller.main_controller import MainWindow
 from controller.login_controller import LoginWindow
 import dawpag.utils as u
+from dawpag import config_watcher
 from dawpag.configuration import config
 
 log = u.get_logger('dawpag.startup')
@@ -46,17 +47,21 @@ class MainApp(object):
         from assessor.model import Config
         import assessor
         assessor.DEFAULT_SUBSIDIARY=Config.get('default_subsidiary', 1)
-        log.debug('Loaded default subsidiary: %d' % assessor.DEFAULT_SUBSIDIARY)
+        log.debug('Loaded default subsidiary: %d', assessor.DEFAULT_SUBSIDIARY)
 
     def start(self):
         """
         Start the GTK Application
         """
         self.load_default_config()
+        if config.get_bool('main.watch_config', False):
+            config_watcher.start(config)
         gtk.main()
 
 def start():
     log.debug('starting up...')
-    log.debug('configuration file is "%s"' % config.CONFIG_FILE)
+    log.debug('configuration file is "%s"', config.CONFIG_FILE)
+    from assessor.model.tables import create_tables
+    create_tables()
     app = MainApp()
     app.start()
\ No newline at end of file
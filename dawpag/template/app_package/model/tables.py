@@ -27,9 +27,6 @@ from sqlalchemy import Integer, String, Boolean, Numeric, DateTime, Text,\
     PickleType
 
 
-engine = get_engine()
-
-
 users_table = Table('users', metadata,
     Column('id', Integer, primary_key=True),
     Column('name', String(15), unique=True),
@@ -252,5 +249,9 @@ account_transactions_table = Table('account_transactions', metadata,
 # Um estorno por sua vez podera recolocar uma conta (bill) que foi quitada por
 # um lancamento como aberta novamente. o historico fica apenas nas transacoes.
 
-# Create all database tables
-metadata.create_all(engine)
\ No newline at end of file
+def create_tables():
+    """
+    Create all database tables that do not exist yet. Called at startup, not
+    on import, so importing the model does not connect to the database
+    """
+    metadata.create_all(get_engine())
\ No newline at end of file
@@ -21,6 +21,7 @@
 
 from assessor.model import Subsidiary
 import dawpag.utils as u
+from dawpag import lookup_cache
 import gtk
 
 log = u.get_logger('assessor.utils')
@@ -32,9 +33,10 @@ class SubsidiarySelect(object):
         #self.combo = combo
         item_list = gtk.ListStore(object, str)
         default_id = -1
-        for ix, sub in enumerate(Subsidiary.all()):
-            item_list.append([sub, getattr(sub, 'name')])
-            if default == sub:
+        for ix, option in enumerate(lookup_cache.get_options(Subsidiary,
+            'name')):
+            item_list.append(list(option))
+            if default is not None and default.id == option[0]:
                 default_id = ix
         cell = gtk.CellRendererText()
         combo.pack_start(cell, True)
@@ -45,9 +47,10 @@ class SubsidiarySelect(object):
             combo.set_active(default_id)
 
     def __on_combo_change(self, combo, data=None):
+        # The combo model holds (id, name) options, not objects
         cb_active = combo.get_active()
         cb_model = combo.get_model()
         if cb_active >= 0:
-            obj = cb_model[cb_active][0]
+            obj = Subsidiary.get(cb_model[cb_active][0])
             if self.callback:
                 self.callback(obj)
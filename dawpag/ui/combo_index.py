@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+"""An index of the rows of a combobox by the value of its key column
+"""
+
+import gtk
+
+
+class ComboIndex(object):
+    """
+    Keep a dict from the key column value of each row of a combo model to a
+    gtk.TreeRowReference, so a row is selected by key without walking the
+    model.
+    The index is discarded when rows of the model are inserted, deleted,
+    changed or reordered, or when the combo gets another model, and is built
+    again on the next selection
+    """
+    def __init__(self, combo, column=0):
+        self.combo = combo
+        self.column = column
+        self.__refs = None
+        self.__model = None
+        self.__handlers = []
+        combo.connect('notify::model', self.__on_model_set)
+        self.__watch(combo.get_model())
+
+    def __watch(self, model):
+        for handler in self.__handlers:
+            self.__model.disconnect(handler)
+        self.__handlers = []
+        self.__model = model
+        self.__refs = None
+        if model is not None:
+            for signal in ('row-inserted', 'row-deleted', 'row-changed',
+                'rows-reordered'):
+                self.__handlers.append(model.connect(signal,
+                    self.__on_model_changed))
+
+    def __on_model_set(self, combo, pspec):
+        self.__watch(combo.get_model())
+
+    def __on_model_changed(self, model, *args):
+        self.__refs = None
+
+    def __build(self):
+        self.__refs = {}
+        it = self.__model.get_iter_first()
+        while it:
+            key = self.__model.get_value(it, self.column)
+            # Keep the first row of repeated keys, as a linear search would
+            if key not in self.__refs:
+                self.__refs[key] = gtk.TreeRowReference(self.__model,
+                    self.__model.get_path(it))
+            it = self.__model.iter_next(it)
+
+    # Public Methods
+
+    def select(self, key):
+        """
+        Set the row with given key as the active row of combo. Return False,
+        leaving the selection unchanged, if there is no such row
+        """
+        if self.__model is None:
+            return False
+        if self.__refs is None:
+            self.__build()
+        ref = self.__refs.get(key)
+        if ref is None or not ref.valid():
+            return False
+        self.combo.set_active_iter(self.__model.get_iter(ref.get_path()))
+        return True
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+"""A list model that loads the rows of a query on demand, page by page,
+keeping only a bounded number of pages in memory
+"""
+
+import gobject
+import gtk
+
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_MAX_PAGES = 20
+
+
+class PlaceholderRow(object):
+    """
+    Value of the rows of LazyQueryModel whose object is no longer in the
+    query result, every attribute is None
+    """
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return None
+
+    def __nonzero__(self):
+        return False
+
+# The placeholder returned for every missing row
+PLACEHOLDER_ROW = PlaceholderRow()
+
+
+class LazyQueryModel(gtk.GenericTreeModel):
+    """
+    A single column list model, holding the objects returned by a query.
+
+    Only the row count is queried when the query is set. Rows are fetched in
+    pages of page_size objects when a cell asks for its value, and at most
+    max_pages pages are kept, the least recently used page is dropped first.
+    Objects appended to the model (newly inserted ones) are kept after the
+    queried rows. Rows whose object is no longer in the query result, deleted
+    since the row count was queried, hold PLACEHOLDER_ROW.
+    The view must not measure every row, which would load every page: use
+    fixed sizing on its columns and fixed height mode, as BaseController does.
+    """
+    def __init__(self, query=None, page_size=DEFAULT_PAGE_SIZE,
+        max_pages=DEFAULT_MAX_PAGES):
+        gtk.GenericTreeModel.__init__(self)
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.__query = None
+        self.__count = 0
+        self.__pages = {}
+        self.__page_order = []
+        self.__appended = []
+        if query is not None:
+            self.set_query(query)
+
+    def __len__(self):
+        return self.__count + len(self.__appended)
+
+    def __clear_pages(self):
+        self.__pages = {}
+        self.__page_order = []
+
+    def __get_page(self, page):
+        """
+        Return the list of objects of given page, querying it if not cached
+        """
+        if page in self.__pages:
+            # Move page to the end of usage list
+            self.__page_order.remove(page)
+            self.__page_order.append(page)
+            return self.__pages[page]
+        rows = self.__query.offset(page * self.page_size).limit(
+            self.page_size).all()
+        self.__pages[page] = rows
+        self.__page_order.append(page)
+        while len(self.__page_order) > self.max_pages:
+            del self.__pages[self.__page_order.pop(0)]
+        return rows
+
+    def __get_row(self, row):
+        if row >= self.__count:
+            return self.__appended[row - self.__count]
+        page, ix = divmod(row, self.page_size)
+        rows = self.__get_page(page)
+        if ix < len(rows):
+            return rows[ix]
+        return PLACEHOLDER_ROW
+
+    # Public Methods
+
+    def set_query(self, query):
+        """
+        Set the query that feeds the model. Query should be ordered and not
+        limited, the model pages over it with offset and limit.
+        Note: detach the model from the view before calling this method and
+        attach it again after, so the view reads the new row count
+        """
+        self.__query = query
+        self.__count = query.count()
+        self.__appended = []
+        self.__clear_pages()
+
+    def clear(self):
+        """
+        Remove all rows from model.
+        Note: rows are not removed one by one, detach the model from the view
+        before calling this method and attach it again after, as for
+        set_query. Replacing the model by a new one is as fast
+        """
+        self.__query = None
+        self.__count = 0
+        self.__appended = []
+        self.__clear_pages()
+
+    def append(self, values):
+        """
+        Append an object after the queried rows, and return its iter
+        """
+        self.__appended.append(values[0])
+        row = len(self) - 1
+        it = self.get_iter((row,))
+        self.row_inserted((row,), it)
+        return it
+
+    def remove(self, iter):
+        """
+        Remove the row pointed by iter. A queried row is excluded from the
+        query, so pages fetched after the object is deleted still match
+        """
+        row = self.get_user_data(iter)
+        if row >= self.__count:
+            self.__appended.pop(row - self.__count)
+        else:
+            obj = self.__get_row(row)
+            if not isinstance(obj, PlaceholderRow):
+                self.__query = self.__query.filter(
+                    obj.__class__.id != obj.id)
+            self.__count -= 1
+            self.__clear_pages()
+        self.row_deleted((row,))
+
+    # GenericTreeModel Interface
+
+    def on_get_flags(self):
+        return gtk.TREE_MODEL_LIST_ONLY
+
+    def on_get_n_columns(self):
+        return 1
+
+    def on_get_column_type(self, index):
+        return gobject.TYPE_PYOBJECT
+
+    def on_get_iter(self, path):
+        if path[0] < len(self):
+            return path[0]
+        return None
+
+    def on_get_path(self, rowref):
+        return (rowref,)
+
+    def on_get_value(self, rowref, column):
+        return self.__get_row(rowref)
+
+    def on_iter_next(self, rowref):
+        if rowref + 1 < len(self):
+            return rowref + 1
+        return None
+
+    def on_iter_children(self, parent):
+        if parent is None and len(self):
+            return 0
+        return None
+
+    def on_iter_has_child(self, rowref):
+        return False
+
+    def on_iter_n_children(self, rowref):
+        if rowref is None:
+            return len(self)
+        return 0
+
+    def on_iter_nth_child(self, parent, n):
+        if parent is None and n < len(self):
+            return n
+        return None
+
+    def on_iter_parent(self, child):
+        return None
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+"""A relation combo for big lookup tables, that queries only the options
+matching the text typed by the user
+"""
+
+import gobject
+import gtk
+
+from dawpag import lookup_cache
+
+DEFAULT_LIMIT = 50
+DEFAULT_DELAY = 250
+MIN_LENGTH = 1
+
+
+class RelationCompletion(object):
+    """
+    Turn a gtk.ComboBoxEntry into a type-ahead selector of objects of model.
+
+    While the user types, the options whose field starts with the text are
+    queried, at most limit rows, delay miliseconds after the last key, and
+    shown by a gtk.EntryCompletion and by the combo list. Recent lookups are
+    cached by dawpag.lookup_cache.
+
+    The combo never holds the whole table, the selection is kept as the id and
+    label of the selected object, so selecting an object does not search the
+    options.
+
+        on_select: called with (combo) when the user selects an option
+    """
+    def __init__(self, combo, model, field, on_select=None,
+        limit=DEFAULT_LIMIT, delay=DEFAULT_DELAY):
+        self.combo = combo
+        self.model = model
+        self.field = field
+        self.limit = limit
+        self.delay = delay
+        self.__on_select = on_select
+        self.__selected = None
+        self.__timeout = None
+        self.__updating = False
+        self.__store = gtk.ListStore(object, str)
+        combo.set_model(self.__store)
+        combo.set_text_column(1)
+        completion = gtk.EntryCompletion()
+        completion.set_model(self.__store)
+        completion.set_text_column(1)
+        # Options are already filtered by database
+        completion.set_match_func(lambda c, key, it: True)
+        completion.connect('match-selected', self.__on_match_selected)
+        self.__entry = combo.child
+        self.__entry.set_completion(completion)
+        self.__entry.connect('changed', self.__on_text_changed)
+        combo.connect('changed', self.__on_combo_changed)
+
+    def __select(self, option, notify):
+        self.__selected = option
+        if notify and self.__on_select:
+            self.__on_select(self.combo)
+
+    def __on_match_selected(self, completion, model, iter):
+        option = (model.get_value(iter, 0), model.get_value(iter, 1))
+        self.__set_text(option[1])
+        self.__select(option, True)
+        return True
+
+    def __on_combo_changed(self, combo):
+        if self.__updating:
+            return
+        it = combo.get_active_iter()
+        if it is not None:
+            self.__select((self.__store.get_value(it, 0),
+                self.__store.get_value(it, 1)), True)
+
+    def __on_text_changed(self, entry):
+        if self.__updating:
+            return
+        text = entry.get_text()
+        if self.__selected is not None and text != self.__selected[1]:
+            self.__select(None, True)
+        if self.__timeout is not None:
+            gobject.source_remove(self.__timeout)
+            self.__timeout = None
+        if len(text) >= MIN_LENGTH:
+            self.__timeout = gobject.timeout_add(self.delay,
+                self.__on_timeout)
+
+    def __on_timeout(self):
+        self.__timeout = None
+        self.__fill(lookup_cache.search(self.model, self.field,
+            self.__entry.get_text(), self.limit))
+        self.__entry.get_completion().complete()
+        return False
+
+    def __fill(self, options):
+        self.__updating = True
+        try:
+            self.__store.clear()
+            for option in options:
+                self.__store.append(list(option))
+        finally:
+            self.__updating = False
+
+    def __set_text(self, text):
+        self.__updating = True
+        try:
+            self.__entry.set_text(text)
+        finally:
+            self.__updating = False
+
+    # Public Methods
+
+    def get_selected_id(self):
+        """
+        Return the id of selected object, or None
+        """
+        if self.__selected is None:
+            return None
+        return self.__selected[0]
+
+    def set_selected(self, obj):
+        """
+        Show obj as the selected object, or clear the selection if obj is None
+        """
+        if obj is None:
+            self.__selected = None
+            self.__set_text('')
+        else:
+            label = getattr(obj, self.field)
+            self.__selected = (obj.id, label)
+            self.__set_text(label or '')
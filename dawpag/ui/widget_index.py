@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+"""An index of the widgets of glade widget trees by name and name prefix
+"""
+
+import gtk.glade
+
+
+class WidgetIndex(object):
+    """
+    Index the widgets of glade widget trees by name, in a dict, and by name
+    prefix, in a trie. When two trees have widgets with the same name, the
+    widget of the tree added first is found by name, as a search through the
+    trees in order would do.
+    Prefix lookups are kept until another tree is added
+    """
+    def __init__(self):
+        self.__widgets = {}
+        # Trie nodes are [widgets_named_by_node, {char: child_node}]
+        self.__root = [[], {}]
+        self.__prefixes = {}
+
+    def add_tree(self, tree):
+        """
+        Index all widgets of glade widget tree
+        """
+        for widget in tree.get_widget_prefix(''):
+            name = gtk.glade.get_widget_name(widget)
+            if name not in self.__widgets:
+                self.__widgets[name] = widget
+            node = self.__root
+            for char in name:
+                node = node[1].setdefault(char, [[], {}])
+            node[0].append(widget)
+        self.__prefixes = {}
+
+    def get(self, name):
+        """
+        Return the widget with given name, or None
+        """
+        return self.__widgets.get(name)
+
+    def get_prefix(self, prefix):
+        """
+        Return the list of widgets whose name starts with prefix
+        """
+        widgets = self.__prefixes.get(prefix)
+        if widgets is not None:
+            return widgets
+        widgets = []
+        node = self.__root
+        for char in prefix:
+            node = node[1].get(char)
+            if node is None:
+                break
+        if node is not None:
+            pending = [node]
+            while pending:
+                node = pending.pop()
+                widgets.extend(node[0])
+                pending.extend(node[1].values())
+        self.__prefixes[prefix] = widgets
+        return widgets
@@ -42,47 +42,64 @@ class ValueUnset:
 
 class DawpagLogger(object):
     """
-    A customized simpler log emmiter, to simplify the configuration file
+    A customized simpler log emmiter, to simplify the configuration file.
+    Messages are sent to the standard logger of the same name, prefixed by the
+    name. A message can take % arguments, that are formatted only if the level
+    of the message is enabled, so pass them as arguments instead of formatting
+    the message at call:
+        log.debug('populating %s with value %s', name, value)
+    Debug calls on hot paths can be wrapped in "if __debug__:", python -O
+    compiles them away
     """
     def __init__(self, loggername):
         self.__name = loggername
+        self.logger = logging.getLogger(loggername)
+
+    def __log(self, level, message, args):
+        if self.logger.isEnabledFor(level):
+            if args:
+                message = message % args
+            self.logger.log(level, _name_message_format % {
+                "name": self.__name,
+                "message": message
+                })
+
+    def is_enabled_for(self, level):
+        """
+        Return True if messages of given level are logged
+        """
+        return self.logger.isEnabledFor(level)
 
-    def __format(self, message):
-        return _name_message_format % {
-            "name": self.__name,
-            "message": message
-            }
-
-    def critical(self, message):
+    def critical(self, message, *args):
         """
         Log level 50, messages are logged if log level is set to CRITICAL
         """
-        logging.critical(self.__format(message))
+        self.__log(logging.CRITICAL, message, args)
 
-    def error(self, message):
+    def error(self, message, *args):
         """
         Log level 40, messages are logged if log level is set to ERROR
         """
-        logging.error(self.__format(message))
+        self.__log(logging.ERROR, message, args)
 
-    def warning(self, message):
+    def warning(self, message, *args):
         """
         Log level 30, messages are logged if log level is set to WARNING
         """
-        logging.warning(self.__format(message))
+        self.__log(logging.WARNING, message, args)
 
-    def info(self, message):
+    def info(self, message, *args):
         """
         Log level 20, messages are logged if log level is set to INFO
         """
         # TODO: log info messages to a database log table
-        logging.info(self.__format(message))
+        self.__log(logging.INFO, message, args)
 
-    def debug(self, message):
+    def debug(self, message, *args):
         """
         Log level 10, messages are logged if log level is set to DEBUG
         """
-        logging.debug(self.__format(message))
+        self.__log(logging.DEBUG, message, args)
 
 
 def get_file(name):
@@ -131,6 +148,18 @@ def escape_markup(text):
     return _escape_markup(text)
 
 
+# Escape character used in LIKE patterns built from user text
+LIKE_ESCAPE = '\\'
+
+def escape_like(text):
+    """
+    Return text with the LIKE wildcards % and _ escaped, to be matched
+    literally in a pattern used with escape=LIKE_ESCAPE
+    """
+    return text.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2).replace('%',
+        LIKE_ESCAPE + '%').replace('_', LIKE_ESCAPE + '_')
+
+
 def get_pango_markup(text, bold=False, italic=False, underline=None,
                    strikethrough=False, size=None, color=None, bgcolor=None,
                    weight=None, font_family=None, style=None, rise=None):
@@ -371,6 +400,7 @@ def get_model():
 
 
 def get_logger(loggername):
+    cfg.logger_names.add(loggername)
     return DawpagLogger(loggername)
 
 
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+"""Pool of hidden window instances for frequently opened dialogs.
+
+A pooled window is hidden instead of destroyed when closed, and shown again on
+the next acquire, without building its widget tree again. Windows that use the
+pool call release() where they would destroy their window, and should reset
+their state before being shown again.
+"""
+
+from dawpag import utils as u
+
+log = u.get_logger('dawpag.window_pool')
+
+# Maximum hidden instances kept of each window class
+MAX_IDLE = 2
+
+# Hidden instances by window class
+_idle = {}
+
+
+def acquire(cls, *args, **kwargs):
+    """
+    Return a hidden instance of window class cls, or a new one created with
+    given args if none is available
+    """
+    idle = _idle.get(cls)
+    if idle:
+        log.debug('reusing pooled %s', cls.__name__)
+        return idle.pop()
+    obj = cls(*args, **kwargs)
+    # Closing by window manager hides the window and returns it to pool
+    obj.window.connect('delete-event', _on_delete_event, obj)
+    return obj
+
+
+def release(obj):
+    """
+    Hide the window of obj and keep it for reuse, or destroy it if the pool
+    of its class is full
+    """
+    idle = _idle.setdefault(obj.__class__, [])
+    if obj in idle:
+        return
+    if len(idle) >= MAX_IDLE:
+        obj.window.destroy()
+        return
+    obj.window.hide()
+    idle.append(obj)
+
+
+def _on_delete_event(window, event, obj):
+    release(obj)
+    # Returning True stops the window from being destroyed
+    return True
+
+
+def clear():
+    """
+    Destroy all hidden windows
+    """
+    for idle in _idle.values():
+        for obj in idle:
+            obj.window.destroy()
+    _idle.clear()
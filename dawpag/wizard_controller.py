@@ -125,12 +125,12 @@ class WizardController(BaseController):
         v1, v2 = True, True
         if hasattr(self, '_step_validate'):
             log.debug("Generic validation found will call for "
-                "step %d" % self.__current_step)
+                "step %d", self.__current_step)
             v1 = getattr(self, '_step_validate').__call__(self.__current_step)
         step_validator_method = '_step_validate_%d' % self.__current_step
         if hasattr(self, step_validator_method):
             log.debug("Target validation found for step %d will "
-                "call" % self.__current_step)
+                "call", self.__current_step)
             v2 = getattr(self, step_validator_method).__call__()
         return v1 and v2
 
@@ -184,7 +184,7 @@ class WizardController(BaseController):
         self.__step_map = []
         for ix,step in enumerate(step_list):
             self.__step_map.append((ix,step))
-        log.debug('steeps mapped:\n MAP: %s' % str(self.__step_map))
+        log.debug('steeps mapped:\n MAP: %s', self.__step_map)
 
     def current_step(self, step=None):
         """
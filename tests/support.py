@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+"""
+Configuration shared by the tests, a SQLite database in a temporary
+directory. Import it before the dawpag modules that read configuration
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from dawpag import configuration as cfg
+
+CONFIG = """[global]
+main.environment=test
+
+[test]
+database.dburi="sqlite:///%s"
+database.encoding=utf-8
+log.level=CRITICAL
+database.log.level=CRITICAL
+%s"""
+
+LOG_CONFIG = """[loggers]
+keys=root
+
+[handlers]
+keys=nullHandler
+
+[formatters]
+keys=
+
+[logger_root]
+level=CRITICAL
+handlers=nullHandler
+
+[handler_nullHandler]
+class=StreamHandler
+args=(sys.stderr,)
+"""
+
+tempdir = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, tempdir, True)
+config_file = os.path.join(tempdir, 'config.cfg')
+dburi = 'sqlite:///%s' % os.path.join(tempdir, 'test.sqlite')
+
+
+def write_config(extra=''):
+    """
+    Write the configuration file, extra lines are added to the test section
+    """
+    open(config_file, 'w').write(CONFIG % (os.path.join(tempdir,
+        'test.sqlite'), extra))
+
+
+def committed(column):
+    """
+    Sorted values of column in the committed rows of its table, read on a
+    connection of its own
+    """
+    engine = create_engine(dburi, poolclass=NullPool)
+    rows = engine.execute(column.table.select().order_by(column))
+    return [row[column.name] for row in rows]
+
+write_config()
+open(os.path.join(tempdir, 'log.cfg'), 'w').write(LOG_CONFIG)
+cfg.set_config(cfg.AppConfig(config_file))
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+"""
+Tests of the controller hooks of dawpag.binding.FieldBinding
+"""
+
+import unittest
+
+from sqlalchemy import Table, Column, Integer, String
+from sqlalchemy.orm import mapper
+
+import support
+
+from dawpag import database
+from dawpag.binding import FieldBinding
+from dawpag.enums import WidgetKind
+from dawpag.model import Model
+
+people = Table('binding_people', database.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('name', String(50), default='nobody'))
+
+
+class Person(Model):
+    pass
+
+mapper(Person, people)
+
+
+class Widget(object):
+    name = 'ed_name'
+
+
+class Controller(object):
+    def _format_widget_value(self, name, value):
+        return value
+
+
+class ClassHooksController(Controller):
+    def _default_name(self):
+        return 'class default'
+
+    def _validate_name(self, value):
+        return value == 'valid'
+
+
+class HooksTest(unittest.TestCase):
+    def bind(self, controller):
+        return FieldBinding(controller, Person, 'name', Widget(),
+            WidgetKind.ENTRY)
+
+    def test_column_default(self):
+        binding = self.bind(Controller())
+        self.assertEqual(binding.default(), 'nobody')
+        self.assertEqual(binding.validator, None)
+
+    def test_class_hooks(self):
+        binding = self.bind(ClassHooksController())
+        self.assertEqual(binding.default(), 'class default')
+        self.assertEqual(binding.validator('valid'), True)
+
+    def test_instance_hooks(self):
+        controller = Controller()
+        binding = self.bind(controller)
+        controller._default_name = lambda: 'instance default'
+        controller._validate_name = lambda value: value == 'valid'
+        self.assertEqual(binding.default(), 'instance default')
+        self.assertEqual(binding.validator('valid'), True)
+        self.assertEqual(binding.validator('other'), False)
+
+    def test_instance_overrides_class(self):
+        controller = ClassHooksController()
+        controller._default_name = lambda: 'instance default'
+        binding = self.bind(controller)
+        self.assertEqual(binding.default(), 'instance default')
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+"""
+Tests of the application engine and sessions of dawpag.database
+"""
+
+import unittest
+
+from sqlalchemy import Table, Column, Integer, String
+
+import support
+
+from dawpag import configuration as cfg
+from dawpag import database
+from dawpag.database import session
+
+notes = Table('database_notes', database.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('text', String(50)))
+
+
+class ReloadTest(unittest.TestCase):
+    def setUp(self):
+        notes.create(bind=database.get_engine(), checkfirst=True)
+
+    def tearDown(self):
+        session.rollback()
+        support.write_config()
+        cfg.config.reload_config()
+        database.get_engine().execute(notes.delete())
+
+    def test_keeps_transaction(self):
+        engine = database.get_engine()
+        session.execute(notes.insert(), {'text': 'before'})
+        support.write_config('database.pool_size=3\n')
+        self.assert_('database.pool_size' in cfg.config.reload_config())
+        self.assert_(database.get_engine() is not engine)
+        session.execute(notes.insert(), {'text': 'after'})
+        session.commit()
+        self.assertEqual(support.committed(notes.c.text), ['after',
+            'before'])
+
+    def test_rolls_back_transaction(self):
+        session.execute(notes.insert(), {'text': 'before'})
+        support.write_config('database.pool_size=3\n')
+        cfg.config.reload_config()
+        session.rollback()
+        self.assertEqual(support.committed(notes.c.text), [])
+
+    def test_new_sessions_use_new_engine(self):
+        support.write_config('database.pool_size=3\n')
+        cfg.config.reload_config()
+        engine = database.get_engine()
+        self.assert_(session.connection().engine is engine)
+
+
+if __name__ == '__main__':
+    unittest.main()
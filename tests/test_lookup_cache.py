@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+"""
+Tests of the invalidation of dawpag.lookup_cache by the writes of Model
+"""
+
+import unittest
+
+from sqlalchemy import Table, Column, Integer, String
+from sqlalchemy.orm import mapper
+
+import support
+
+from dawpag import database
+from dawpag import lookup_cache
+from dawpag.database import session
+from dawpag.model import Model
+
+groups = Table('lookup_groups', database.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('name', String(50)))
+
+
+class Group(Model):
+    pass
+
+mapper(Group, groups)
+
+
+class InvalidateTest(unittest.TestCase):
+    def setUp(self):
+        groups.create(bind=database.get_engine(), checkfirst=True)
+        lookup_cache.clear()
+
+    def tearDown(self):
+        session.rollback()
+        session.expunge_all()
+        database.get_engine().execute(groups.delete())
+        lookup_cache.clear()
+
+    def names(self):
+        return [name for id, name in lookup_cache.get_options(Group, 'name')]
+
+    def test_save(self):
+        self.assertEqual(self.names(), [])
+        Group(name=u'tools').save()
+        self.assertEqual(self.names(), [u'tools'])
+
+    def test_save_changes(self):
+        group = Group(name=u'tools')
+        group.save()
+        self.assertEqual(self.names(), [u'tools'])
+        group.name = u'parts'
+        group.save()
+        self.assertEqual(self.names(), [u'parts'])
+
+    def test_delete(self):
+        group = Group(name=u'tools')
+        group.save()
+        self.assertEqual(self.names(), [u'tools'])
+        group.delete()
+        self.assertEqual(self.names(), [])
+
+    def test_search(self):
+        self.assertEqual(lookup_cache.search(Group, 'name', u't', 10), [])
+        group = Group(name=u'tools')
+        group.save()
+        self.assertEqual(lookup_cache.search(Group, 'name', u't', 10),
+            [(group.id, u'tools')])
+
+    def test_bulk_save(self):
+        self.assertEqual(self.names(), [])
+        Group.bulk_save([Group(name=u'tools'), Group(name=u'parts')])
+        self.assertEqual(self.names(), [u'tools', u'parts'])
+
+
+if __name__ == '__main__':
+    unittest.main()
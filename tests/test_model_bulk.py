@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+# DAWPaG - Desktop Applications With Python and GTK+
+# Copyright © 2008 Alexandre da Silva / Carlos Antonio da Silva
+#
+# This file is part of DAWPaG.
+#
+# DAWPaG. is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# DAWPaG. is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with DAWPaG.; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+"""
+Tests of Model.bulk_save and Model.bulk_update on a SQLite database
+"""
+
+import unittest
+
+from sqlalchemy import Table, Column, Integer, String
+from sqlalchemy.orm import mapper
+
+import support
+
+from dawpag import database
+from dawpag.database import session
+from dawpag.exceptions import PendingWritesError
+from dawpag.model import Model
+
+items = Table('bulk_items', database.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('code', String(10), unique=True),
+    Column('name', String(50)))
+
+
+class Item(Model):
+    def before_save(self):
+        if self.name == 'bad hook':
+            raise ValueError('bad hook')
+
+    def after_save(self):
+        if self.name == 'interrupt':
+            raise KeyboardInterrupt()
+
+mapper(Item, items)
+
+# Composite primary key, updated through its objects
+pairs = Table('bulk_pairs', database.metadata,
+    Column('left', Integer, primary_key=True),
+    Column('right', Integer, primary_key=True),
+    Column('code', String(10), unique=True))
+
+
+class Pair(Model):
+    pass
+
+mapper(Pair, pairs)
+
+
+def codes(table=items):
+    """
+    Codes of the committed rows of table
+    """
+    return support.committed(table.c.code)
+
+
+class BulkTestCase(unittest.TestCase):
+    def setUp(self):
+        database.metadata.create_all(bind=database.get_engine())
+
+    def tearDown(self):
+        session.rollback()
+        session.expunge_all()
+        database.get_engine().execute(items.delete())
+        database.get_engine().execute(pairs.delete())
+
+
+class BulkSaveTest(BulkTestCase):
+    def test_saves_objects(self):
+        objects = [Item(code='a'), Item(code='b'), Item(code='c')]
+        result = Item.bulk_save(objects, batch_size=2)
+        self.assertEqual(result.count, 3)
+        self.assertEqual(result.failures, [])
+        self.assertEqual(codes(), ['a', 'b', 'c'])
+        for obj in objects:
+            self.assert_(obj in session)
+            self.assert_(obj.id is not None)
+
+    def test_reports_bad_row(self):
+        duplicate = Item(code='a')
+        objects = [Item(code='a'), duplicate, Item(code='b')]
+        result = Item.bulk_save(objects)
+        self.assertEqual(result.count, 2)
+        self.assertEqual(len(result.failures), 1)
+        self.assert_(result.failures[0][0] is duplicate)
+        self.assertEqual(codes(), ['a', 'b'])
+        self.assert_(duplicate not in session)
+
+    def test_reports_first_row(self):
+        Item.bulk_save([Item(code='a')])
+        first = Item(code='a')
+        result = Item.bulk_save([first, Item(code='b'), Item(code='c')])
+        self.assertEqual(result.count, 2)
+        self.assert_(result.failures[0][0] is first)
+        self.assertEqual(codes(), ['a', 'b', 'c'])
+
+    def test_keeps_other_batches(self):
+        objects = [Item(code='a'), Item(code='b'), Item(code='b'),
+            Item(code='c'), Item(code='d')]
+        result = Item.bulk_save(objects, batch_size=2)
+        self.assertEqual(result.count, 4)
+        self.assert_(result.failures[0][0] is objects[2])
+        self.assertEqual(codes(), ['a', 'b', 'c', 'd'])
+
+    def test_reports_hook_failure(self):
+        bad = Item(code='b', name='bad hook')
+        result = Item.bulk_save([Item(code='a'), bad, Item(code='c')])
+        self.assertEqual(result.count, 2)
+        self.assert_(result.failures[0][0] is bad)
+        self.assert_(isinstance(result.failures[0][1], ValueError))
+        self.assertEqual(codes(), ['a', 'c'])
+
+    def test_interrupt_rolls_back_every_batch(self):
+        objects = [Item(code='a'), Item(code='b'),
+            Item(code='c', name='interrupt')]
+        self.assertRaises(KeyboardInterrupt, Item.bulk_save, objects, 1)
+        self.assertEqual(codes(), [])
+
+    def test_leaves_session_alone(self):
+        Item.bulk_save([Item(code='a', name='old')])
+        loaded = session.query(Item).filter_by(code='a').one()
+        loaded.name = 'edited'
+        result = Item.bulk_save([Item(code='b'), Item(code='b')])
+        self.assertEqual(len(result.failures), 1)
+        # Neither expired nor flushed by the savepoint of the failing row
+        self.assert_('name' in loaded.__dict__)
+        self.assertEqual(loaded.name, 'edited')
+        self.assert_(loaded in session.dirty)
+        self.assertEqual(support.committed(items.c.name), [None, 'old'])
+
+    def test_leaves_session_uncommitted(self):
+        pending = Item(code='app')
+        session.add(pending)
+        Item.bulk_save([Item(code='bulk')])
+        self.assertEqual(codes(), ['bulk'])
+        session.rollback()
+        self.assert_(pending not in session)
+        self.assertEqual(codes(), ['bulk'])
+
+    def test_refuses_session_writes(self):
+        session.add(Item(code='app'))
+        session.flush()
+        self.assertRaises(PendingWritesError, Item.bulk_save,
+            [Item(code='bulk')])
+        session.rollback()
+        self.assertEqual(codes(), [])
+        Item.bulk_save([Item(code='bulk')])
+        self.assertEqual(codes(), ['bulk'])
+
+    def test_saves_session_objects(self):
+        Item.bulk_save([Item(code='a', name='old')])
+        loaded = session.query(Item).filter_by(code='a').one()
+        loaded.name = 'edited'
+        result = Item.bulk_save([loaded, Item(code='a')])
+        self.assertEqual(result.count, 1)
+        self.assert_(loaded in session)
+        session.expire(loaded)
+        self.assertEqual(loaded.name, 'edited')
+
+
+class BulkUpdateTest(BulkTestCase):
+    def setUp(self):
+        BulkTestCase.setUp(self)
+        self.objects = [Item(code='a'), Item(code='b'), Item(code='c')]
+        Item.bulk_save(self.objects)
+        self.a, self.b, self.c = [obj.id for obj in self.objects]
+
+    def test_updates_rows(self):
+        result = Item.bulk_update([{'id': self.a, 'code': 'x'},
+            {'id': self.b, 'code': 'y'}, {'id': self.c, 'name': 'z'}])
+        self.assertEqual(result.count, 3)
+        self.assertEqual(codes(), ['c', 'x', 'y'])
+
+    def test_reports_bad_mappings(self):
+        mappings = [{'id': self.a, 'code': 'x'}, {'id': self.b, 'code': 'x'},
+            {'code': 'y'}, {'id': self.c, 'missing': 'z'},
+            {'id': self.c, 'code': 'z'}]
+        result = Item.bulk_update(mappings)
+        self.assertEqual(result.count, 2)
+        failed = [mapping for mapping, e in result.failures]
+        self.assertEqual(len(failed), 3)
+        for mapping in mappings[1:4]:
+            self.assert_(mapping in failed)
+        self.assertEqual(codes(), ['b', 'x', 'z'])
+
+    def test_reports_bad_objects(self):
+        Pair.bulk_save([Pair(left=1, right=1, code='a'),
+            Pair(left=1, right=2, code='b'), Pair(left=2, right=1, code='c')])
+        mappings = [{'id': (1, 1), 'code': 'x'}, {'id': (1, 2), 'code': 'x'},
+            {'id': (9, 9), 'code': 'y'}, {'id': (2, 1), 'code': 'z'}]
+        result = Pair.bulk_update(mappings, batch_size=3)
+        self.assertEqual(result.count, 2)
+        failed = [mapping for mapping, e in result.failures]
+        self.assertEqual(failed, mappings[1:3])
+        self.assertEqual(codes(pairs), ['b', 'x', 'z'])
+
+    def test_expires_loaded_objects(self):
+        obj = self.objects[0]
+        self.assertEqual(obj.code, 'a')
+        Item.bulk_update([{'id': self.a, 'code': 'x'}])
+        self.assertEqual(obj.code, 'x')
+
+
+if __name__ == '__main__':
+    unittest.main()